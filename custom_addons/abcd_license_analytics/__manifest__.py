@@ -17,15 +17,18 @@ Fonctionnalités :
 * Analyses par client, édition, module
 * Graphiques interactifs personnalisés
 * Surveillance en temps réel
+* Vue matérialisée de reporting rafraîchie par cron
     """,
     'author': "ABCD",
     'website': "https://www.abcd-group.com",
     'category': 'Tools',
-    'version': '1.0.0',
+    'version': '1.1.0',
     'depends': ['abcd_license_server', 'web'],
     'data': [
         'security/ir.model.access.csv',
+        'data/ir_cron.xml',
         'views/dashboard_views.xml',
+        'views/license_analytics_report_views.xml',
         'views/analytics_menu_views.xml',
     ],
     'assets': {
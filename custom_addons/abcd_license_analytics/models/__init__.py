@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
 from . import license_analytics
+from . import license_analytics_report
@@ -3,13 +3,33 @@
 Modèle d'analyses pour les licences ABCD
 """
 
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import timedelta
+from dateutil.relativedelta import relativedelta
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Durée de vie (en secondes) du payload du tableau de bord mis en cache
+DASHBOARD_CACHE_TTL = 60
+
+# Cache mémoire par worker : {(dbname, uid, company_ids, params): (timestamp, payload)}
+_dashboard_cache = {}
+
+# Protège le cache, partagé par les threads du serveur threadé
+_dashboard_cache_lock = threading.Lock()
+
+# Pas entre deux périodes consécutives pour chaque granularité de tendance
+TREND_STEPS = {
+    'day': relativedelta(days=1),
+    'week': relativedelta(weeks=1),
+    'month': relativedelta(months=1),
+    'quarter': relativedelta(months=3),
+}
+
 
 class LicenseAnalytics(models.TransientModel):
     """Analyses et statistiques des licences"""
@@ -18,46 +38,109 @@ class LicenseAnalytics(models.TransientModel):
     _description = 'ABCD License Analytics'
     
     @api.model
-    def get_license_statistics(self):
-        """Retourne les statistiques globales des licences"""
-        License = self.env['license.license']
-        
-        total_licenses = License.search_count([])
-        active_licenses = License.search_count([('state', '=', 'active')])
-        expired_licenses = License.search_count([('state', '=', 'expired')])
-        expiring_soon = License.search_count([('state', '=', 'expiring_soon')])
-        
+    def _check_report_access(self):
+        """Les lectures SQL sur la vue matérialisée contournent l'ORM"""
+        self.env['license.license'].check_access('read')
+        self.env['license.analytics.report'].check_access('read')
+    
+    @api.model
+    def _get_counters(self):
+        """
+        Calcule tous les compteurs du tableau de bord en une seule requête
+
+        Les compteurs de licences sont lus depuis la vue matérialisée
+        license_analytics_report (lignes sans module) ; les agrégats
+        ``FILTER (WHERE ...)`` remplacent les ``search_count`` successifs.
+        """
+        self._check_report_access()
+        self.env['license.key'].check_access('read')
+        self.env['license.key'].flush_model(['name', 'active', 'key_generated'])
+
+        # Les clés archivées sont exclues, comme le ferait search_count([])
+        query = """
+            WITH lic AS (
+                SELECT
+                    COALESCE(SUM(license_count), 0)::int AS total,
+                    COALESCE(SUM(license_count) FILTER (WHERE state = 'active'), 0)::int AS active,
+                    COALESCE(SUM(license_count) FILTER (WHERE state = 'expired'), 0)::int AS expired,
+                    COALESCE(SUM(license_count) FILTER (WHERE state = 'expiring_soon'), 0)::int AS expiring_soon,
+                    COALESCE(SUM(license_count) FILTER (WHERE edition = 'standard'), 0)::int AS edition_standard,
+                    COALESCE(SUM(license_count) FILTER (WHERE edition = 'pro'), 0)::int AS edition_pro,
+                    COALESCE(SUM(license_count) FILTER (WHERE edition = 'enterprise'), 0)::int AS edition_enterprise
+                FROM license_analytics_report
+                WHERE module IS NULL
+            ),
+            k AS (
+                SELECT
+                    COUNT(*) FILTER (WHERE active) AS keys_total,
+                    COUNT(*) FILTER (WHERE active AND key_generated) AS keys_generated
+                FROM license_key
+            ),
+            top_key AS (
+                SELECT k.name AS most_used_name, SUM(r.license_count)::int AS most_used_count
+                FROM license_key k
+                JOIN license_analytics_report r ON r.key_id = k.id AND r.module IS NULL
+                WHERE k.active AND k.key_generated
+                GROUP BY k.id, k.name
+                ORDER BY SUM(r.license_count) DESC
+                LIMIT 1
+            )
+            SELECT lic.*, k.*, top_key.most_used_name, top_key.most_used_count
+            FROM lic CROSS JOIN k LEFT JOIN top_key ON TRUE
+        """
+        self.env.cr.execute(query)
+        return self.env.cr.dictfetchone()
+
+    @api.model
+    def _format_counters(self, counters):
+        """
+        Met en forme les compteurs de _get_counters pour le tableau de bord
+
+        Returns:
+            Dictionnaire {'stats', 'editions', 'keys'}
+        """
         return {
-            'total': total_licenses,
-            'active': active_licenses,
-            'expired': expired_licenses,
-            'expiring_soon': expiring_soon,
+            'stats': {
+                'total': counters['total'],
+                'active': counters['active'],
+                'expired': counters['expired'],
+                'expiring_soon': counters['expiring_soon'],
+            },
+            'editions': {
+                'standard': counters['edition_standard'],
+                'pro': counters['edition_pro'],
+                'enterprise': counters['edition_enterprise'],
+            },
+            'keys': {
+                'total': counters['keys_total'],
+                'active': counters['keys_total'],
+                'generated': counters['keys_generated'],
+                'most_used': {
+                    'name': counters['most_used_name'],
+                    'count': counters['most_used_count'] or 0,
+                },
+            },
         }
+
+    @api.model
+    def get_license_statistics(self):
+        """Retourne les statistiques globales des licences"""
+        return self._format_counters(self._get_counters())['stats']
     
     @api.model
     def get_license_by_edition(self):
         """Retourne la répartition des licences par édition"""
-        License = self.env['license.license']
-        
-        editions = ['standard', 'pro', 'enterprise']
-        result = {}
-        
-        for edition in editions:
-            count = License.search_count([('edition', '=', edition)])
-            result[edition] = count
-        
-        return result
+        return self._format_counters(self._get_counters())['editions']
     
     @api.model
     def get_license_by_client(self, limit=10):
         """Retourne les clients avec le plus de licences"""
-        License = self.env['license.license']
-        
+        self._check_report_access()
         # Grouper par client
         query = """
-            SELECT client_id, COUNT(*) as count
-            FROM license_license
-            WHERE client_id IS NOT NULL
+            SELECT client_id, SUM(license_count)::int AS count
+            FROM license_analytics_report
+            WHERE client_id IS NOT NULL AND module IS NULL
             GROUP BY client_id
             ORDER BY count DESC
             LIMIT %s
@@ -66,9 +149,17 @@ class LicenseAnalytics(models.TransientModel):
         self.env.cr.execute(query, (limit,))
         results = self.env.cr.dictfetchall()
         
+        # Un seul read pour tous les clients (prefetch) ; la vue peut citer un
+        # client supprimé depuis son dernier rafraîchissement
+        clients = self.env['license.client'].browse([row['client_id'] for row in results]).exists()
+        clients.fetch(['name', 'code'])
+        clients_by_id = {client.id: client for client in clients}
+        
         clients_data = []
         for row in results:
-            client = self.env['license.client'].browse(row['client_id'])
+            client = clients_by_id.get(row['client_id'])
+            if not client:
+                continue
             clients_data.append({
                 'name': client.name,
                 'code': client.code,
@@ -98,71 +189,150 @@ class LicenseAnalytics(models.TransientModel):
         } for lic in licenses]
     
     @api.model
-    def get_license_trends(self, months=12):
-        """Retourne les tendances de génération de licences sur X mois"""
-        License = self.env['license.license']
+    def _trend_bucket_start(self, dt, granularity):
+        """Ramène une date au début de sa période (même découpage que date_trunc)"""
+        dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        if granularity == 'week':
+            return dt - timedelta(days=dt.weekday())
+        if granularity == 'month':
+            return dt.replace(day=1)
+        if granularity == 'quarter':
+            return dt.replace(month=3 * ((dt.month - 1) // 3) + 1, day=1)
+        return dt
+    
+    @api.model
+    def _trend_label(self, bucket, granularity):
+        """Libellé lisible d'une période"""
+        if granularity == 'day':
+            return bucket.strftime('%d/%m/%Y')
+        if granularity == 'week':
+            iso_year, iso_week, _weekday = bucket.isocalendar()
+            return f"S{iso_week:02d} {iso_year}"
+        if granularity == 'quarter':
+            return f"T{(bucket.month - 1) // 3 + 1} {bucket.year}"
+        return bucket.strftime('%b %Y')
+    
+    @api.model
+    def get_license_trends(self, months=12, granularity='month', date_from=None, date_to=None):
+        """
+        Retourne les tendances de génération de licences
+
+        Une seule requête ``date_trunc`` + GROUP BY couvre toute la fenêtre ;
+        les périodes sans licence sont complétées en Python. Les fenêtres
+        mensuelles ou trimestrielles jusqu'à aujourd'hui sont lues depuis la
+        vue matérialisée license_analytics_report.
+
+        Args:
+            months: Taille de la fenêtre en mois si date_from n'est pas fourni
+            granularity: 'day', 'week', 'month' ou 'quarter'
+            date_from: Début de la fenêtre (optionnel)
+            date_to: Fin de la fenêtre (optionnel, maintenant par défaut)
+        """
+        if granularity not in TREND_STEPS:
+            raise UserError(_("Granularité inconnue : %s") % granularity)
         
-        now = datetime.now()
-        trends = []
+        use_report = granularity in ('month', 'quarter') and not date_to
+        date_to = fields.Datetime.to_datetime(date_to) or fields.Datetime.now()
+        if date_from:
+            date_from = fields.Datetime.to_datetime(date_from)
+        else:
+            date_from = date_to.replace(day=1) - relativedelta(months=max(months, 1) - 1)
+        start = self._trend_bucket_start(date_from, granularity)
+        
+        if use_report:
+            self._check_report_access()
+            self.env.cr.execute("""
+                SELECT date_trunc(%s, issue_month) AS bucket, SUM(license_count)::int AS count
+                FROM license_analytics_report
+                WHERE module IS NULL AND issue_month >= %s AND issue_month <= %s
+                GROUP BY bucket
+            """, (granularity, start, date_to))
+        else:
+            self.env['license.license'].check_access('read')
+            self.env['license.license'].flush_model(['issued_at'])
+            self.env.cr.execute("""
+                SELECT date_trunc(%s, issued_at) AS bucket, COUNT(*) AS count
+                FROM license_license
+                WHERE issued_at >= %s AND issued_at <= %s
+                GROUP BY bucket
+            """, (granularity, start, date_to))
+        counts = dict(self.env.cr.fetchall())
         
-        for i in range(months - 1, -1, -1):
-            month_start = (now - timedelta(days=30 * i)).replace(day=1, hour=0, minute=0, second=0)
-            if i == 0:
-                month_end = now
-            else:
-                next_month = month_start + timedelta(days=32)
-                month_end = next_month.replace(day=1) - timedelta(seconds=1)
-            
-            count = License.search_count([
-                ('issued_at', '>=', month_start),
-                ('issued_at', '<=', month_end)
-            ])
-            
+        # Compléter les périodes vides
+        trends = []
+        step = TREND_STEPS[granularity]
+        bucket = start
+        while bucket <= date_to:
             trends.append({
-                'month': month_start.strftime('%Y-%m'),
-                'label': month_start.strftime('%b %Y'),
-                'count': count
+                'period': bucket.strftime('%Y-%m-%d'),
+                'month': bucket.strftime('%Y-%m'),
+                'label': self._trend_label(bucket, granularity),
+                'count': counts.get(bucket, 0)
             })
+            bucket += step
         
         return trends
     
     @api.model
-    def get_module_usage(self):
+    def get_module_usage(self, limit=20):
         """Retourne l'utilisation des modules (combien de licences incluent chaque module)"""
-        License = self.env['license.license']
-        
-        all_licenses = License.search([])
-        module_usage = {}
-        
-        for license in all_licenses:
-            if license.modules:
-                modules = [m.strip() for m in license.modules.split(',') if m.strip()]
-                for module in modules:
-                    module_usage[module] = module_usage.get(module, 0) + 1
+        self._check_report_access()
         
-        # Trier par utilisation décroissante
-        sorted_modules = sorted(module_usage.items(), key=lambda x: x[1], reverse=True)
-        
-        return [{'module': mod, 'count': count} for mod, count in sorted_modules[:20]]
+        # Agrégat sur la vue matérialisée, trié par utilisation décroissante
+        self.env.cr.execute("""
+            SELECT module, SUM(license_count)::int AS count
+            FROM license_analytics_report
+            WHERE module IS NOT NULL
+            GROUP BY module
+            ORDER BY count DESC, module
+            LIMIT %s
+        """, (limit,))
+        return self.env.cr.dictfetchall()
     
     @api.model
     def get_key_statistics(self):
         """Retourne les statistiques sur les clés"""
-        Key = self.env['license.key']
-        
-        total_keys = Key.search_count([])
-        active_keys = Key.search_count([('active', '=', True)])
-        generated_keys = Key.search_count([('key_generated', '=', True)])
+        return self._format_counters(self._get_counters())['keys']
+    
+    @api.model
+    def get_dashboard(self, client_limit=10, expiring_days=30, months=12, force_refresh=False):
+        """
+        Retourne l'ensemble des données du tableau de bord en un seul appel
+
+        Le résultat est mémorisé par utilisateur et sociétés actives pendant
+        DASHBOARD_CACHE_TTL secondes (cache mémoire du worker), les licences
+        expirantes étant soumises aux règles d'accès de l'utilisateur.
+        ``force_refresh`` ignore le cache.
+        """
+        # Contrôles d'accès avant toute lecture, y compris depuis le cache
+        self._check_report_access()
+        self.env['license.key'].check_access('read')
+        cache_key = (
+            self.env.cr.dbname,
+            self.env.uid,
+            tuple(self.env.companies.ids),
+            client_limit,
+            expiring_days,
+            months,
+        )
+        now = time.monotonic()
+        if not force_refresh:
+            with _dashboard_cache_lock:
+                cached = _dashboard_cache.get(cache_key)
+            if cached and now - cached[0] < DASHBOARD_CACHE_TTL:
+                return cached[1]
         
-        # Clé la plus utilisée
-        most_used_key = Key.search([('key_generated', '=', True)], order='license_count desc', limit=1)
+        payload = self._format_counters(self._get_counters())
+        payload.update({
+            'clients': self.get_license_by_client(client_limit),
+            'trends': self.get_license_trends(months),
+            'modules': self.get_module_usage(),
+            'expiring': self.get_expiring_licenses(expiring_days),
+        })
         
-        return {
-            'total': total_keys,
-            'active': active_keys,
-            'generated': generated_keys,
-            'most_used': {
-                'name': most_used_key.name if most_used_key else None,
-                'count': most_used_key.license_count if most_used_key else 0
-            }
-        }
+        with _dashboard_cache_lock:
+            # Purger les entrées expirées pour borner la taille du cache
+            for key in [k for k, (ts, _payload) in _dashboard_cache.items() if now - ts >= DASHBOARD_CACHE_TTL]:
+                del _dashboard_cache[key]
+            _dashboard_cache[cache_key] = (now, payload)
+        return payload
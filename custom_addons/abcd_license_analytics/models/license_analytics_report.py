@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Vue matérialisée de reporting pour les licences ABCD
+"""
+
+import logging
+from odoo import models, fields, api, tools
+
+_logger = logging.getLogger(__name__)
+
+
+class LicenseAnalyticsReport(models.Model):
+    """Agrégats des licences par client, édition, clé, module et mois d'émission
+
+    Les lignes sans module (``module`` vide) portent le nombre de licences ;
+    les lignes avec module portent le nombre de licences accordant ce module.
+    Les deux niveaux ne doivent pas être additionnés entre eux.
+    """
+
+    _name = 'license.analytics.report'
+    _description = 'ABCD License Analytics Report'
+    _auto = False
+    _order = 'issue_month desc'
+
+    client_id = fields.Many2one('license.client', string="Client", readonly=True)
+    edition = fields.Selection([
+        ('standard', 'Standard'),
+        ('pro', 'Pro'),
+        ('enterprise', 'Enterprise'),
+    ], string="Édition", readonly=True)
+    key_id = fields.Many2one('license.key', string="Paire de Clés", readonly=True)
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('active', 'Active'),
+        ('expired', 'Expirée'),
+        ('expiring_soon', 'Expire Bientôt'),
+    ], string="Statut", readonly=True)
+    issue_month = fields.Datetime(string="Mois d'Émission", readonly=True)
+    module = fields.Char(string="Module", readonly=True)
+    license_count = fields.Integer(string="Nombre de Licences", readonly=True, aggregator='sum')
+
+    def _query(self):
+        """Requête source de la vue matérialisée"""
+        return """
+            SELECT
+                row_number() OVER (ORDER BY issue_month, client_id, edition, key_id, state, module) AS id,
+                agg.*
+            FROM (
+                SELECT
+                    l.client_id,
+                    l.edition,
+                    l.key_id,
+                    l.state,
+                    date_trunc('month', l.issued_at) AS issue_month,
+                    NULL::varchar AS module,
+                    COUNT(*) AS license_count
+                FROM license_license l
+                GROUP BY 1, 2, 3, 4, 5
+                UNION ALL
+                SELECT
+                    l.client_id,
+                    l.edition,
+                    l.key_id,
+                    l.state,
+                    date_trunc('month', l.issued_at) AS issue_month,
+                    m.name AS module,
+                    COUNT(*) AS license_count
+                FROM license_license l
+                JOIN license_license_module m ON m.license_id = l.id
+                GROUP BY 1, 2, 3, 4, 5, 6
+            ) agg
+        """
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(
+            f"CREATE MATERIALIZED VIEW {self._table} AS ({self._query()})"
+        )
+        # Index unique requis par REFRESH ... CONCURRENTLY
+        self.env.cr.execute(
+            f"CREATE UNIQUE INDEX {self._table}_id_uniq ON {self._table} (id)"
+        )
+        self.env.cr.execute(
+            f"CREATE INDEX {self._table}_module_idx ON {self._table} (module, issue_month)"
+        )
+
+    @api.model
+    def _refresh_view(self):
+        """Rafraîchit la vue sans bloquer les lectures (appelé par le cron)"""
+        self.env['license.license'].flush_model()
+        self.env['license.license.module'].flush_model()
+        self.env.cr.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {self._table}")
+        self.invalidate_model()
+        _logger.info("Vue %s rafraîchie", self._table)
@@ -34,82 +34,29 @@ export class LicenseDashboardWidget extends Component {
 
     async loadData() {
         try {
-            // Charger les statistiques via le service orm d'Odoo 16+
-            const stats = await this.orm.call(
+            // Un seul appel RPC pour l'ensemble du tableau de bord
+            const dashboard = await this.orm.call(
                 "license.analytics",
-                "get_license_statistics",
-                []
+                "get_dashboard",
+                [],
+                { client_limit: 10, expiring_days: 30, months: 12 }
             );
             
-            this.state.stats = stats;
-            await this.loadCharts();
+            this.state.stats = dashboard.stats || {};
+            this.state.editionData = dashboard.editions || {};
+            this.state.trendsData = dashboard.trends || [];
+            this.state.clientsData = dashboard.clients || [];
+            this.state.modulesData = dashboard.modules || [];
+            this.state.expiringData = dashboard.expiring || [];
             this.state.loading = false;
-        } catch (error) {
-            console.error("Erreur lors du chargement des données:", error);
-            this.state.loading = false;
-        }
-    }
-
-    async loadCharts() {
-        try {
-            // Charger les données pour les graphiques et tableaux
-            let editionData = {};
-            try {
-                editionData = await this.orm.call(
-                    "license.analytics",
-                    "get_license_by_edition",
-                    []
-                );
-            } catch (e) { console.log("get_license_by_edition failed", e); }
-
-            let trendsData = [];
-            try {
-                trendsData = await this.orm.call(
-                    "license.analytics",
-                    "get_license_trends",
-                    [12]
-                );
-            } catch (e) { console.log("get_license_trends failed", e); }
-
-            let clientsData = [];
-            try {
-                clientsData = await this.orm.call(
-                    "license.analytics",
-                    "get_license_by_client",
-                    [10]
-                );
-            } catch (e) { console.log("get_license_by_client failed", e); }
-
-            let modulesData = [];
-            try {
-                modulesData = await this.orm.call(
-                    "license.analytics",
-                    "get_module_usage",
-                    []
-                );
-            } catch (e) { console.log("get_module_usage failed", e); }
-
-            let expiringData = [];
-            try {
-                expiringData = await this.orm.call(
-                    "license.analytics",
-                    "get_expiring_licenses",
-                    [30]
-                );
-            } catch (e) { console.log("get_expiring_licenses failed", e); }
-
-            this.state.editionData = editionData || {};
-            this.state.trendsData = trendsData || [];
-            this.state.clientsData = clientsData || [];
-            this.state.modulesData = modulesData || [];
-            this.state.expiringData = expiringData || [];
             
             // Si on est déjà monté (après un reload), on redessine les graphiques
             if (this.editionChartRef.el) {
                 this.renderCharts();
             }
         } catch (error) {
-            console.error("Erreur detail charts:", error);
+            console.error("Erreur lors du chargement des données:", error);
+            this.state.loading = false;
         }
     }
 
@@ -25,7 +25,7 @@ pour la gestion des licences en production.
     'author': "ABCD",
     'website': "https://www.abcd.com",
     'category': 'Tools',
-    'version': '1.0.0',
+    'version': '1.1.0',
     'depends': ['base', 'web', 'mail'],
     'data': [
         'security/ir.model.access.csv',
@@ -3,8 +3,46 @@
 Contrôleur pour les téléchargements de clés et licences
 """
 
+import csv
+import io
+import json
+import logging
+import tempfile
+
+from werkzeug.exceptions import BadRequest
+
 from odoo import http
-from odoo.http import request, content_disposition
+from odoo.http import request, content_disposition, Response
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Nombre de lignes lues par FETCH sur le curseur serveur
+EXPORT_FETCH_SIZE = 2000
+
+# Taille des blocs envoyés pour un fichier XLSX temporaire
+EXPORT_FILE_CHUNK_SIZE = 64 * 1024
+
+# Colonnes exportées : (expression SQL, en-tête)
+EXPORT_COLUMNS = [
+    ('l.id', 'id'),
+    ('l.name', 'alias'),
+    ('c.code', 'client_code'),
+    ('c.name', 'client'),
+    ('l.db_uuid', 'db_uuid'),
+    ('l.edition', 'edition'),
+    ('l.modules', 'modules'),
+    ('l.max_users', 'max_users'),
+    ('l.expiry_date', 'expiry_date'),
+    ('l.issued_at', 'issued_at'),
+    ('l.state', 'state'),
+]
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
 
 
 class DownloadController(http.Controller):
@@ -59,3 +97,140 @@ class DownloadController(http.Controller):
                 ('Content-Disposition', content_disposition(filename)),
             ]
         )
+
+    @http.route('/license/export/<string:export_format>', type='http', auth='user')
+    def export_licenses(self, export_format='csv', export_id=None, ids=None, client_id=None,
+                        include_blob='1', **kwargs):
+        """
+        Exporte les licences en flux (CSV, JSONL ou XLSX)
+
+        Les lignes sont lues par blocs via un curseur serveur (DECLARE/FETCH)
+        et écrites directement dans une réponse HTTP chunked : la mémoire
+        utilisée ne dépend pas du nombre de licences exportées.
+
+        La sélection vient d'un export enregistré (``export_id``, voir
+        license.export) ou, pour de petites sélections, des paramètres
+        ``ids`` et ``client_id``. Un paramètre invalide renvoie une erreur 400.
+        """
+        if export_format not in EXPORT_CONTENT_TYPES:
+            return request.not_found()
+        
+        License = request.env['license.license']
+        License.check_access('read')
+        
+        try:
+            export_id = int(export_id) if export_id else None
+            ids = [int(i) for i in ids.split(',') if i.strip()] if ids else None
+            client_id = int(client_id) if client_id else None
+        except ValueError:
+            raise BadRequest("Paramètres export_id, ids et client_id : entiers attendus")
+        
+        domain = []
+        if export_id:
+            export = request.env['license.export'].browse(export_id).exists()
+            if not export:
+                return request.not_found()
+            domain.extend(export.domain or [])
+        if ids:
+            domain.append(('id', 'in', ids))
+        if client_id:
+            domain.append(('client_id', '=', client_id))
+        
+        # Sous-requête des licences visibles (règles d'accès appliquées)
+        query = License._search(domain)
+        columns = list(EXPORT_COLUMNS)
+        if include_blob not in ('0', 'false', 'False'):
+            columns.append(('l.license_blob', 'license_blob'))
+        sql = SQL(
+            "SELECT %s FROM license_license l LEFT JOIN license_client c ON c.id = l.client_id "
+            "WHERE l.id IN %s ORDER BY l.id",
+            SQL(', '.join(expr for expr, _header in columns)),
+            query.subselect(),
+        )
+        headers = [header for _expr, header in columns]
+        
+        rows = self._iter_export_rows(request.env.registry, sql)
+        writer = getattr(self, f'_stream_{export_format}')
+        filename = f"licences.{export_format}"
+        return Response(
+            writer(headers, rows),
+            headers=[
+                ('Content-Type', EXPORT_CONTENT_TYPES[export_format]),
+                ('Content-Disposition', content_disposition(filename)),
+            ],
+            direct_passthrough=True,
+        )
+    
+    def _iter_export_rows(self, registry, sql):
+        """
+        Génère les lignes de l'export par blocs de EXPORT_FETCH_SIZE
+
+        Le générateur est consommé après la fin de la requête HTTP : il ouvre
+        donc son propre curseur, en lecture seule.
+        """
+        with registry.cursor(readonly=True) as cr:
+            cr.execute(SQL("DECLARE license_export NO SCROLL CURSOR FOR %s", sql))
+            while True:
+                cr.execute("FETCH FORWARD %s FROM license_export", (EXPORT_FETCH_SIZE,))
+                batch = cr.fetchall()
+                if not batch:
+                    break
+                yield batch
+            cr.execute("CLOSE license_export")
+    
+    @staticmethod
+    def _export_value(value):
+        """Convertit une valeur SQL en valeur exportable"""
+        if value is None:
+            return ''
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+    
+    def _stream_csv(self, headers, batches):
+        """Écrit les blocs au format CSV"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(headers)
+        for batch in batches:
+            writer.writerows([self._export_value(v) for v in row] for row in batch)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+    
+    def _stream_jsonl(self, headers, batches):
+        """Écrit les blocs au format JSON Lines (un objet par licence)"""
+        for batch in batches:
+            yield ''.join(
+                json.dumps(dict(zip(headers, map(self._export_value, row))), ensure_ascii=False) + '\n'
+                for row in batch
+            ).encode('utf-8')
+    
+    def _stream_xlsx(self, headers, batches):
+        """
+        Écrit les blocs au format XLSX
+
+        xlsxwriter en mode ``constant_memory`` écrit chaque ligne sur disque ;
+        le fichier temporaire est ensuite envoyé par blocs.
+        """
+        import xlsxwriter
+        
+        with tempfile.TemporaryFile() as tmp:
+            workbook = xlsxwriter.Workbook(tmp, {'constant_memory': True, 'in_memory': False})
+            sheet = workbook.add_worksheet('Licences')
+            sheet.write_row(0, 0, headers)
+            row_idx = 1
+            for batch in batches:
+                for row in batch:
+                    sheet.write_row(row_idx, 0, [self._export_value(v) for v in row])
+                    row_idx += 1
+            workbook.close()
+            
+            tmp.seek(0)
+            while True:
+                chunk = tmp.read(EXPORT_FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
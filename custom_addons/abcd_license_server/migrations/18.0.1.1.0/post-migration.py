@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+def migrate(cr, version):
+    """Alimente license_license_module depuis le champ texte modules existant"""
+    cr.execute("""
+        INSERT INTO license_license_module (license_id, name, create_date, write_date)
+        SELECT DISTINCT l.id, btrim(m.name), NOW() AT TIME ZONE 'UTC', NOW() AT TIME ZONE 'UTC'
+        FROM license_license l
+        CROSS JOIN LATERAL unnest(string_to_array(l.modules, ',')) AS m(name)
+        WHERE btrim(m.name) <> ''
+        ON CONFLICT (license_id, name) DO NOTHING
+    """)
@@ -3,3 +3,4 @@
 from . import license_client
 from . import license_key
 from . import license
+from . import license_module
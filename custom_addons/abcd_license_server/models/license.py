@@ -67,6 +67,14 @@ class License(models.Model):
         help="Liste des modules séparés par des virgules (ex: abcd_sales_pro,abcd_inventory_plus)"
     )
     
+    module_ids = fields.One2many(
+        'license.license.module',
+        'license_id',
+        string="Modules Accordés",
+        readonly=True,
+        help="Modules autorisés (table normalisée, alimentée depuis le champ Modules)"
+    )
+    
     modules_list = fields.Text(
         string="Modules (Liste)",
         compute='_compute_modules_list',
@@ -220,15 +228,18 @@ class License(models.Model):
             self.env.add_to_compute(self._fields['is_expiring_soon'], licenses_to_update)
 
     
+    @api.model
+    def _parse_modules(self, modules):
+        """Retourne la liste ordonnée et sans doublon des modules d'une chaîne"""
+        if not modules:
+            return []
+        return list(dict.fromkeys(m.strip() for m in modules.split(',') if m.strip()))
+    
     @api.depends('modules')
     def _compute_module_count(self):
         """Compte le nombre de modules autorisés"""
         for record in self:
-            if record.modules:
-                modules_list = [m.strip() for m in record.modules.split(',') if m.strip()]
-                record.module_count = len(modules_list)
-            else:
-                record.module_count = 0
+            record.module_count = len(self._parse_modules(record.modules))
     
     notes = fields.Text(
         string="Notes",
@@ -245,6 +256,50 @@ class License(models.Model):
             else:
                 record.modules_list = ''
     
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Alimente la table normalisée des modules"""
+        records = super().create(vals_list)
+        records._sync_module_ids()
+        return records
+    
+    def write(self, vals):
+        """Resynchronise la table normalisée si les modules changent"""
+        result = super().write(vals)
+        if 'modules' in vals:
+            self._sync_module_ids()
+        return result
+    
+    def _sync_module_ids(self):
+        """
+        Synchronise license.license.module avec le champ texte ``modules``
+        
+        Une seule lecture des lignes existantes, puis un unlink et un create
+        groupés pour tout le recordset.
+        """
+        if not self:
+            return
+        
+        LicenseModule = self.env['license.license.module'].sudo()
+        existing = {}
+        for line in LicenseModule.search_read([('license_id', 'in', self.ids)], ['license_id', 'name']):
+            existing[(line['license_id'][0], line['name'])] = line['id']
+        
+        to_create = []
+        wanted = set()
+        for record in self:
+            for module in self._parse_modules(record.modules):
+                key = (record.id, module)
+                wanted.add(key)
+                if key not in existing:
+                    to_create.append({'license_id': record.id, 'name': module})
+        
+        to_unlink = [line_id for key, line_id in existing.items() if key not in wanted]
+        if to_unlink:
+            LicenseModule.browse(to_unlink).unlink()
+        if to_create:
+            LicenseModule.create(to_create)
+    
     @api.constrains('expiry_date')
     def _check_expiry_date(self):
         """Vérifie que la date d'expiration est dans le futur"""
@@ -596,6 +651,19 @@ class License(models.Model):
             'target': 'self',
         }
     
+    def action_export_licenses(self, export_format='csv'):
+        """
+        Exporte les licences sélectionnées via le contrôleur de flux
+
+        La sélection est conservée côté serveur (license.export) : l'URL ne
+        porte que l'identifiant de l'export, quelle que soit sa taille.
+        """
+        export = self.env['license.export'].create({
+            'export_format': export_format,
+            'domain': [('id', 'in', self.ids)],
+        })
+        return export.action_download()
+    
     def action_generate_alias(self):
         """Génère automatiquement un alias pour la licence"""
         self.ensure_one()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Modules autorisés par licence (table normalisée)
+"""
+
+from odoo import models, fields
+
+
+class LicenseModule(models.Model):
+    """Module accordé par une licence ABCD
+
+    Une ligne par couple (licence, module), alimentée automatiquement depuis
+    le champ texte ``license.license.modules``.
+    """
+
+    _name = 'license.license.module'
+    _description = 'ABCD License Module Entitlement'
+    _order = 'license_id, name'
+
+    license_id = fields.Many2one(
+        'license.license',
+        string="Licence",
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    name = fields.Char(
+        string="Module",
+        required=True,
+        index=True,
+        help="Nom technique du module autorisé"
+    )
+
+    _sql_constraints = [
+        ('license_module_unique', 'UNIQUE(license_id, name)',
+         'Un module ne peut apparaître qu\'une fois par licence.')
+    ]
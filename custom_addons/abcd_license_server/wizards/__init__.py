@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
 from . import generate_license_wizard
+from . import license_export
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Sélection de licences à exporter, conservée côté serveur
+"""
+
+from odoo import models, fields
+
+
+class LicenseExport(models.TransientModel):
+    """
+    Export de licences en attente de téléchargement
+
+    Le domaine des licences sélectionnées est stocké ici plutôt que dans
+    l'URL du contrôleur d'export : une grande sélection ne dépasse pas les
+    limites de longueur d'URL des navigateurs et proxies. L'enregistrement
+    n'est lisible que par l'utilisateur qui l'a créé.
+    """
+    
+    _name = 'license.export'
+    _description = 'Export de Licences'
+    
+    export_format = fields.Selection(
+        [('csv', 'CSV'), ('jsonl', 'JSONL'), ('xlsx', 'XLSX')],
+        string="Format",
+        required=True,
+        default='csv'
+    )
+    
+    domain = fields.Json(
+        string="Domaine",
+        help="Domaine des licences à exporter"
+    )
+    
+    def action_download(self):
+        """Lance le téléchargement via le contrôleur de flux"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/license/export/{self.export_format}?export_id={self.id}',
+            'target': 'self',
+        }
@@ -22,6 +22,7 @@ Fonctionnalités :
 * Import de données depuis Excel
 * Export en PDF, HTML ou DOCX
 * Historique des lettres générées
+* Génération en lot depuis plusieurs commandes (rendu en arrière-plan)
     """,
 
     'author': "My Company",
@@ -31,18 +32,20 @@ Fonctionnalités :
     'version': '1.0.1',
 
     # any module necessary for this one to work correctly
-    'depends': ['base', 'web', 'mail'],
+    'depends': ['base', 'web', 'mail', 'sale'],
 
     # always loaded
     'data': [
         'security/ir.model.access.csv',
         'security/security.xml',
+        'data/ir_cron.xml',
         'views/lettre_variable_views.xml',
         'views/lettre_template_views.xml',
         'views/lettre_instance_views.xml',
         'views/lettre_tableau_views.xml',
         'views/lettre_excel_views.xml',
         'views/wizard_views.xml',
+        'views/lettre_batch_views.xml',
         'views/menu_views.xml',
         'views/templates.xml',
     ],
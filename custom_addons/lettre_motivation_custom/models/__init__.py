@@ -4,6 +4,8 @@ from . import lettre_template
 from . import lettre_variable
 from . import lettre_instance
 from . import lettre_instance_variable
+from . import lettre_batch
+from . import lettre_render_cache
 from . import lettre_tableau
 from . import lettre_excel
 from . import lettre_template_binding
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+
+class LettreMotivationBatch(models.Model):
+    """Génération de lettres en lot, rendue en arrière-plan par un cron"""
+    _name = 'lettre.motivation.batch'
+    _description = 'Génération de Lettres en Lot'
+    _order = 'create_date desc'
+
+    # Nombre de lettres rendues entre deux commits
+    CHUNK_SIZE = 50
+
+    # Nombre d'échecs consécutifs d'un bloc avant d'abandonner le lot
+    MAX_FAILURES = 3
+
+    name = fields.Char(
+        string='Nom',
+        required=True,
+        help='Nom de la génération en lot'
+    )
+
+    template_id = fields.Many2one(
+        'lettre.motivation.template',
+        string='Modèle',
+        required=True,
+        ondelete='restrict',
+        help='Modèle utilisé pour toutes les lettres du lot'
+    )
+
+    format_sortie = fields.Selection(
+        [
+            ('pdf', 'PDF'),
+            ('html', 'HTML'),
+            ('docx', 'DOCX'),
+        ],
+        string='Format de Sortie',
+        required=True,
+        default='pdf',
+        help='Format des fichiers générés'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Société',
+        required=True,
+        readonly=True,
+        default=lambda self: self.env.company,
+        help='Société active lors de la demande ; le cron rend les lettres dans cette société'
+    )
+
+    instance_ids = fields.One2many(
+        'lettre.motivation.instance',
+        'batch_id',
+        string='Lettres',
+        help='Lettres créées par ce lot'
+    )
+
+    state = fields.Selection(
+        [
+            ('pending', 'En Attente'),
+            ('running', 'En Cours'),
+            ('done', 'Terminé'),
+            ('failed', 'En Échec'),
+        ],
+        string='État',
+        default='pending',
+        required=True,
+        help='État du rendu en arrière-plan'
+    )
+
+    total_count = fields.Integer(
+        string='Nombre de Lettres',
+        readonly=True,
+        help='Nombre total de lettres à rendre'
+    )
+
+    done_count = fields.Integer(
+        string='Lettres Traitées',
+        readonly=True,
+        help='Nombre de lettres traitées (succès et erreurs)'
+    )
+
+    error_count = fields.Integer(
+        string='Erreurs',
+        readonly=True,
+        help='Nombre de lettres en erreur'
+    )
+
+    progress = fields.Float(
+        string='Progression',
+        compute='_compute_progress',
+        help='Pourcentage de lettres traitées'
+    )
+
+    failure_count = fields.Integer(
+        string='Échecs Consécutifs',
+        readonly=True,
+        help='Nombre de tentatives consécutives en échec sur le bloc en cours'
+    )
+
+    log = fields.Text(
+        string='Journal',
+        readonly=True,
+        help='Erreurs rencontrées pendant le rendu'
+    )
+
+    @api.depends('done_count', 'total_count')
+    def _compute_progress(self):
+        """Calcule le pourcentage d'avancement"""
+        for batch in self:
+            batch.progress = 100.0 * batch.done_count / batch.total_count if batch.total_count else 0.0
+
+    def _trigger_processing(self):
+        """Demande au cron de rendre les lots en attente dès que possible"""
+        self.env.ref('lettre_motivation_custom.ir_cron_process_lettre_batch')._trigger()
+
+    def _register_failure(self, message):
+        """
+        Journalise l'échec d'un bloc et valide la transaction
+
+        Après MAX_FAILURES échecs consécutifs, le lot passe en échec et n'est
+        plus repris par le cron.
+        """
+        self.ensure_one()
+        failure_count = self.failure_count + 1
+        vals = {
+            'failure_count': failure_count,
+            'log': '\n'.join(filter(None, [self.log, _('Échec du bloc (tentative %(count)d) : %(error)s',
+                                                    count=failure_count, error=message)])),
+        }
+        if failure_count >= self.MAX_FAILURES:
+            vals['state'] = 'failed'
+        self.write(vals)
+        self.env.cr.commit()  # pylint: disable=invalid-commit
+
+    def _process(self):
+        """
+        Rend les lettres du lot par blocs de CHUNK_SIZE
+
+        Un commit est fait après chaque bloc : en cas d'interruption, le cron
+        reprend à partir de done_count. Une lettre en erreur est journalisée
+        sans bloquer le reste du lot ; un bloc en échec est annulé (savepoint)
+        et retenté au passage suivant du cron, jusqu'à MAX_FAILURES fois.
+        """
+        self.ensure_one()
+        self.state = 'running'
+        self.env.cr.commit()  # pylint: disable=invalid-commit
+
+        instances = self.instance_ids.sorted('id')
+        while self.done_count < len(instances):
+            chunk = instances[self.done_count:self.done_count + self.CHUNK_SIZE]
+            try:
+                with self.env.cr.savepoint():
+                    self._process_chunk(chunk)
+            except Exception as e:
+                _logger.exception("Lot %s : échec du bloc à partir de la lettre %s", self.id, chunk[:1].id)
+                self.env.invalidate_all()
+                self._register_failure(str(e))
+                return
+            self.env.cr.commit()  # pylint: disable=invalid-commit
+            # Libérer le cache des lettres déjà rendues (fichiers volumineux)
+            self.env.invalidate_all()
+
+        self.state = 'done'
+        self.env.cr.commit()  # pylint: disable=invalid-commit
+
+    def _process_chunk(self, chunk):
+        """Rend un bloc de lettres et met à jour l'avancement du lot"""
+        errors = []
+        rendered = chunk.browse()
+        for instance in chunk:
+            try:
+                with self.env.cr.savepoint():
+                    instance.action_generer_contenu()
+                rendered |= instance
+            except Exception as e:
+                _logger.warning("Lot %s : erreur sur la lettre %s : %s", self.id, instance.id, e)
+                errors.append(f"{instance.name} : {e}")
+        # Rendu des fichiers du bloc en parallèle (pool de processus)
+        for instance_id, error in rendered._generer_fichiers_batch().items():
+            _logger.warning("Lot %s : erreur sur la lettre %s : %s", self.id, instance_id, error)
+            errors.append(f"{rendered.browse(instance_id).name} : {error}")
+        vals = {
+            'done_count': self.done_count + len(chunk),
+            'error_count': self.error_count + len(errors),
+            'failure_count': 0,
+        }
+        if errors:
+            vals['log'] = '\n'.join(filter(None, [self.log] + errors))
+        self.write(vals)
+
+    @api.model
+    def _cron_process_batches(self):
+        """
+        Traite les lots en attente ou interrompus ; un lot en erreur ne bloque pas les suivants
+
+        Chaque lot est rendu avec l'utilisateur qui l'a demandé et sa société
+        (droits d'accès, règles multi-société), et non avec ceux du cron.
+        """
+        for batch in self.search([('state', 'in', ('pending', 'running'))], order='id'):
+            try:
+                batch.with_user(batch.create_uid or self.env.user).with_company(batch.company_id)._process()
+            except Exception as e:
+                self.env.cr.rollback()
+                self.env.invalidate_all()
+                _logger.exception("Lot %s : échec du traitement", batch.id)
+                batch._register_failure(str(e))
+
+    def action_relancer(self):
+        """Remet un lot en échec en attente de traitement"""
+        self.filtered(lambda b: b.state == 'failed').write({'state': 'pending', 'failure_count': 0})
+        self._trigger_processing()
+
+    def action_view_instances(self):
+        """Ouvrir les lettres du lot"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Lettres - %s') % self.name,
+            'res_model': 'lettre.motivation.instance',
+            'view_mode': 'list,form',
+            'domain': [('batch_id', '=', self.id)],
+        }
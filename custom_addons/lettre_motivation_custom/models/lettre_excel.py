@@ -2,7 +2,13 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+import csv
+import io
 import json
+from itertools import islice
+
+# Nombre de lignes lues et créées par lot lors de l'import
+TABULAR_IMPORT_BATCH_SIZE = 1000
 
 
 class LettreMotivationExcelSource(models.Model):
@@ -17,10 +23,35 @@ class LettreMotivationExcelSource(models.Model):
         help='Nom de la source Excel'
     )
 
+    type_source = fields.Selection(
+        [
+            ('xlsx', 'Excel (.xlsx)'),
+            ('csv', 'CSV'),
+            ('parquet', 'Parquet'),
+        ],
+        string='Type de Fichier',
+        required=True,
+        default='xlsx',
+        help='Format du fichier source'
+    )
+
     fichier_excel = fields.Binary(
-        string='Fichier Excel',
+        string='Fichier',
         required=True,
-        help='Fichier Excel (.xlsx)'
+        help='Fichier source (.xlsx, .csv ou .parquet)'
+    )
+
+    csv_delimiter = fields.Char(
+        string='Séparateur CSV',
+        size=1,
+        default=',',
+        help='Caractère séparant les colonnes du fichier CSV'
+    )
+
+    csv_encoding = fields.Char(
+        string='Encodage CSV',
+        default='utf-8-sig',
+        help='Encodage du fichier CSV (ex: utf-8-sig, latin-1)'
     )
 
     nom_fichier = fields.Char(
@@ -95,103 +126,192 @@ class LettreMotivationExcelSource(models.Model):
             col_idx //= 26
         return result
 
+    def _iter_xlsx(self, data):
+        """
+        Lit un fichier .xlsx en flux (openpyxl read_only) dans la plage configurée
+
+        Génère d'abord la liste des en-têtes puis des lots de colonnes.
+        """
+        from openpyxl import load_workbook
+        from openpyxl.utils import range_boundaries
+        
+        # Lecture en flux (read_only) des valeurs calculées
+        workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        try:
+            # Sélectionner la feuille
+            if self.feuille not in workbook.sheetnames:
+                raise UserError(_('La feuille "%s" n\'existe pas dans le fichier!') % self.feuille)
+            
+            sheet = workbook[self.feuille]
+            
+            # Déterminer la plage de cellules (ex: A1:D10, A:D, 2:50) ; None = sans borne
+            min_col = min_row = max_col = max_row = None
+            if self.range_cellules:
+                try:
+                    min_col, min_row, max_col, max_row = range_boundaries(
+                        self.range_cellules.strip().upper().replace('$', '')
+                    )
+                except (TypeError, ValueError):
+                    raise UserError(_('Plage de cellules invalide : "%s" (ex: A1:D10)') % self.range_cellules)
+            
+            rows = sheet.iter_rows(
+                min_row=min_row or 1, max_row=max_row,
+                min_col=min_col or 1, max_col=max_col,
+                values_only=True,
+            )
+            
+            # La première ligne de la plage contient les en-têtes
+            headers = list(next(rows, ()))
+            yield headers, (min_col or 1)
+            for chunk in _chunked(rows, TABULAR_IMPORT_BATCH_SIZE):
+                yield _transpose(chunk, len(headers))
+        finally:
+            workbook.close()
+    
+    def _iter_csv(self, data):
+        """Lit un fichier CSV en flux (module csv), par lots de colonnes"""
+        stream = io.TextIOWrapper(io.BytesIO(data), encoding=self.csv_encoding or 'utf-8-sig', newline='')
+        reader = csv.reader(stream, delimiter=self.csv_delimiter or ',')
+        headers = next(reader, [])
+        yield headers, 1
+        for chunk in _chunked(reader, TABULAR_IMPORT_BATCH_SIZE):
+            yield _transpose(chunk, len(headers))
+    
+    def _iter_parquet(self, data):
+        """Lit un fichier Parquet par lots (pyarrow), déjà en colonnes"""
+        import pyarrow.parquet as pq
+        
+        parquet_file = pq.ParquetFile(io.BytesIO(data))
+        yield parquet_file.schema_arrow.names, 1
+        for batch in parquet_file.iter_batches(batch_size=TABULAR_IMPORT_BATCH_SIZE):
+            yield [column.to_pylist() for column in batch.columns]
+    
     def action_importer_excel(self):
-        """Importe les données Excel dans le tableau associé"""
+        """
+        Importe les données de la source (Excel, CSV ou Parquet) dans le tableau associé
+
+        Les lecteurs fournissent les en-têtes puis des lots de colonnes ; le
+        mapping des colonnes (lettre A, B, C... ou nom d'en-tête) est résolu une
+        seule fois et les lignes sont créées par lots de taille fixe.
+        """
         self.ensure_one()
         
         if not self.fichier_excel:
-            raise UserError(_('Aucun fichier Excel chargé!'))
+            raise UserError(_('Aucun fichier chargé!'))
         
         if not self.tableau_id:
             raise UserError(_('Aucun tableau associé!'))
         
+        readers = {
+            'xlsx': self._iter_xlsx,
+            'csv': self._iter_csv,
+            'parquet': self._iter_parquet,
+        }
+        
         try:
             import base64
-            import io
-            from openpyxl import load_workbook
             
             # Décoder le fichier
-            excel_data = base64.b64decode(self.fichier_excel)
-            workbook = load_workbook(io.BytesIO(excel_data))
-            
-            # Sélectionner la feuille
-            if self.feuille not in workbook.sheetnames:
-                raise UserError(_('La feuille "%s" n\'existe pas dans le fichier!') % self.feuille)
-            
-            sheet = workbook[self.feuille]
-            
-            # Déterminer la plage de cellules
-            if self.range_cellules:
-                # TODO: Parser la plage (ex: A1:D10) - pour l'instant on utilise toute la feuille
-                max_row = sheet.max_row
-                max_col = sheet.max_column
-            else:
-                # Utiliser toute la feuille
-                max_row = sheet.max_row
-                max_col = sheet.max_column
+            data = base64.b64decode(self.fichier_excel)
+            batches = readers[self.type_source or 'xlsx'](data)
+            headers, first_col = next(batches)
             
             # Lire les données
             mapping = self.get_mapping_dict()
-            colonnes_tableau = {col.name: col for col in self.tableau_id.colonnes_ids}
+            colonnes_tableau = set(self.tableau_id.colonnes_ids.mapped('name'))
             
             # Supprimer les anciennes lignes
             self.tableau_id.lignes_ids.unlink()
             
-            # Lire les lignes (en supposant que la première ligne contient les en-têtes)
-            lignes_data = []
-            
-            # Lire la première ligne pour obtenir les en-têtes
-            headers = []
-            for col_idx in range(1, max_col + 1):
-                header_cell = sheet.cell(row=1, column=col_idx).value
+            # Colonnes retenues : (position dans la ligne, colonne du tableau)
+            targets = []
+            for offset, header_cell in enumerate(headers):
                 if header_cell:
                     # Convertir l'index de colonne en lettre (A, B, C...)
-                    col_letter = self._get_column_letter(col_idx)
-                    headers.append((col_letter, str(header_cell)))
+                    col_letter = self._get_column_letter(first_col + offset)
+                    header = str(header_cell)
+                    # Mapper la colonne source vers la colonne du tableau
+                    col_name = mapping.get(col_letter, header.lower().replace(' ', '_'))
+                    if col_name in colonnes_tableau:
+                        targets.append((offset, col_name))
             
-            # Lire les données
-            for row_idx in range(2, max_row + 1):
-                row_values = []
-                for col_idx in range(1, max_col + 1):
-                    cell_value = sheet.cell(row=row_idx, column=col_idx).value
-                    row_values.append(cell_value)
-                
-                if not any(v is not None for v in row_values):  # Ignorer les lignes vides
-                    continue
-                
-                valeurs = {}
-                for col_idx, (col_letter, header) in enumerate(headers):
-                    if col_idx < len(row_values):
-                        cell_value = row_values[col_idx]
-                        # Mapper la colonne Excel vers la colonne du tableau
-                        col_name = mapping.get(col_letter, header.lower().replace(' ', '_'))
-                        if col_name in colonnes_tableau:
-                            valeurs[col_name] = str(cell_value) if cell_value else ''
-                
-                if valeurs:
+            # Stockage en colonnes : tout le tableau dans un seul champ
+            tableau = self.tableau_id
+            en_colonnes = tableau.mode_stockage == 'colonnes'
+            colonnes_data = {col_name: [] for offset, col_name in targets}
+            
+            # Sinon, créer les lignes par lots de taille fixe (mémoire bornée)
+            Ligne = self.env['lettre.motivation.tableau.ligne']
+            imported = 0
+            sequence = 0
+            for columns in batches:
+                # Une colonne du tableau alimentée deux fois garde la dernière source
+                selected = list({col_name: columns[offset] for offset, col_name in targets}.items())
+                lignes_data = []
+                for i in range(len(columns[0]) if selected else 0):
+                    sequence += 1
+                    # Ignorer les lignes vides
+                    if not any(column[i] not in (None, '') for column in columns):
+                        continue
+                    if en_colonnes:
+                        for col_name, values in selected:
+                            colonnes_data[col_name].append(str(values[i]) if values[i] else '')
+                        imported += 1
+                        continue
+                    valeurs = {
+                        col_name: str(values[i]) if values[i] else ''
+                        for col_name, values in selected
+                    }
                     lignes_data.append({
-                        'tableau_id': self.tableau_id.id,
+                        'tableau_id': tableau.id,
                         'valeurs': json.dumps(valeurs, ensure_ascii=False),
-                        'sequence': row_idx - 1,
+                        'sequence': sequence,
                     })
+                
+                if lignes_data:
+                    Ligne.create(lignes_data)
+                    imported += len(lignes_data)
+                    # Ne pas garder en cache les lignes déjà écrites
+                    Ligne.invalidate_model()
             
-            # Créer les lignes
-            if lignes_data:
-                self.env['lettre.motivation.tableau.ligne'].create(lignes_data)
+            if en_colonnes:
+                tableau._set_donnees_colonnes(colonnes_data)
             
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
                     'title': _('Import réussi'),
-                    'message': _('%d lignes importées avec succès!') % len(lignes_data),
+                    'message': _('%d lignes importées avec succès!') % imported,
                     'type': 'success',
                     'sticky': False,
                 }
             }
             
+        except UserError:
+            raise
         except ImportError:
+            if self.type_source == 'parquet':
+                raise UserError(_('La bibliothèque pyarrow n\'est pas installée! Installez-la avec: pip install pyarrow'))
             raise UserError(_('La bibliothèque openpyxl n\'est pas installée! Installez-la avec: pip install openpyxl'))
         except Exception as e:
-            raise UserError(_('Erreur lors de l\'import Excel: %s') % str(e))
+            raise UserError(_('Erreur lors de l\'import: %s') % str(e))
+
+
+def _chunked(iterable, size):
+    """Découpe un itérable en listes de taille fixe"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
 
+def _transpose(rows, width):
+    """Convertit une liste de lignes en liste de colonnes (complétées par None)"""
+    width = max([width] + [len(row) for row in rows])
+    return [
+        [row[i] if i < len(row) else None for row in rows]
+        for i in range(width)
+    ]
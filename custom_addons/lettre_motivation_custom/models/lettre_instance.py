@@ -1,10 +1,30 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, _
-from odoo.exceptions import UserError, ValidationError
+from odoo.exceptions import AccessError, UserError, ValidationError
+import hashlib
 import json
-import re
+import tempfile
 from datetime import datetime
+from itertools import islice
+from urllib.parse import quote as url_quote
+
+from markupsafe import Markup, escape
+
+from odoo.models import PREFETCH_MAX
+from odoo.tools import split_every
+
+from .lettre_template import placeholder_key
+
+# Type MIME des fichiers générés, par extension
+FILE_MIMETYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'html': 'text/html',
+}
+
+# Nombre de lettres lues à la fois lors d'une fusion
+MERGE_READ_BATCH_SIZE = 200
 
 
 class LettreMotivationInstance(models.Model):
@@ -55,6 +75,14 @@ class LettreMotivationInstance(models.Model):
         help='ID de l\'enregistrement source'
     )
 
+    batch_id = fields.Many2one(
+        'lettre.motivation.batch',
+        string='Génération en Lot',
+        index=True,
+        ondelete='set null',
+        help='Génération en lot ayant créé cette lettre'
+    )
+
     niveau = fields.Selection(
         related='template_id.niveau',
         string='Niveau',
@@ -99,7 +127,8 @@ class LettreMotivationInstance(models.Model):
 
     fichier_genere = fields.Binary(
         string='Fichier Généré',
-        help='Fichier PDF/DOCX/HTML généré'
+        attachment=True,
+        help='Fichier PDF/DOCX/HTML généré (stocké dans le filestore)'
     )
 
     nom_fichier = fields.Char(
@@ -107,6 +136,13 @@ class LettreMotivationInstance(models.Model):
         help='Nom du fichier généré'
     )
 
+    render_digest = fields.Char(
+        string='Digest du Rendu',
+        copy=False,
+        readonly=True,
+        help='Empreinte des entrées ayant produit le fichier généré (cache de rendu)'
+    )
+
     date_generation = fields.Datetime(
         string='Date de Génération',
         default=fields.Datetime.now,
@@ -146,55 +182,87 @@ class LettreMotivationInstance(models.Model):
 
     def get_valeurs_dict(self):
         """Retourne les valeurs sous forme de dictionnaire Python"""
-        valeurs = {}
+        self.ensure_one()
+        return self._get_valeurs_dicts()[self.id]
+
+    def _get_valeurs_dicts(self):
+        """
+        Valeurs des variables de plusieurs lettres, chargées en une fois
+
+        Une requête pour les lettres, une pour leurs lignes de variables et une
+        pour les variables (des lignes et des modèles) : aucun chargement paresseux
+        par enregistrement, quel que soit le nombre de lettres.
+
+        Règles (par lettre) :
+        - valeur de la ligne si remplie, sinon valeur par défaut de la variable
+        - variables du modèle absentes des lignes : valeur par défaut si définie
+        - si aucune valeur, repli sur le JSON ``valeurs_variables``
+
+        Returns:
+            Dictionnaire {instance_id: {nom_variable: valeur}}
+        """
+        if not self:
+            return {}
         
-        # Priorité aux valeurs dans variables_valeurs_ids
-        if self.variables_valeurs_ids:
-            for var_val in self.variables_valeurs_ids:
-                # Essayer de récupérer le nom de la variable de plusieurs façons
-                var_name = None
-                
-                # Méthode 1: Depuis variable_id
-                if var_val.variable_id and var_val.variable_id.name:
-                    var_name = var_val.variable_id.name
-                # Méthode 2: Depuis le champ name (related)
-                elif hasattr(var_val, 'name') and var_val.name:
-                    var_name = var_val.name
-                
-                if var_name:
-                    # Utiliser la valeur si remplie, sinon valeur par défaut
-                    if var_val.valeur:
-                        valeurs[var_name] = var_val.valeur
-                    elif var_val.variable_id and var_val.variable_id.valeur_par_defaut:
-                        valeurs[var_name] = var_val.variable_id.valeur_par_defaut
-                    elif hasattr(var_val, 'valeur_par_defaut') and var_val.valeur_par_defaut:
-                        valeurs[var_name] = var_val.valeur_par_defaut
-        
-        # Compléter avec les valeurs par défaut du template pour les variables manquantes
-        if self.template_id:
-            for var_obj in self.template_id.variables_ids:
-                if var_obj.name not in valeurs:
-                    # Si la variable n'est pas dans valeurs, utiliser sa valeur par défaut
-                    if var_obj.valeur_par_defaut:
-                        valeurs[var_obj.name] = var_obj.valeur_par_defaut
-        
-        # Si pas de valeurs dans variables_valeurs_ids, utiliser le JSON
-        if not valeurs and self.valeurs_variables:
-            try:
-                valeurs = json.loads(self.valeurs_variables)
-            except:
-                pass
+        instances = self.read(['template_id', 'valeurs_variables'], load=None)
+        lignes = self.env['lettre.motivation.instance.variable'].search_read(
+            [('instance_id', 'in', self.ids)],
+            ['instance_id', 'variable_id', 'valeur'],
+            order='sequence, id',
+            load=None,
+        )
+        
+        template_ids = {inst['template_id'] for inst in instances if inst['template_id']}
+        variable_ids = {ligne['variable_id'] for ligne in lignes if ligne['variable_id']}
+        variables = self.env['lettre.motivation.variable'].search_read(
+            ['|', ('id', 'in', list(variable_ids)), ('template_id', 'in', list(template_ids))],
+            ['template_id', 'name', 'valeur_par_defaut'],
+            load=None,
+        )
+        variables_by_id = {var['id']: var for var in variables}
+        variables_by_template = {}
+        for var in variables:
+            variables_by_template.setdefault(var['template_id'], []).append(var)
+        
+        lignes_by_instance = {}
+        for ligne in lignes:
+            lignes_by_instance.setdefault(ligne['instance_id'], []).append(ligne)
         
-        return valeurs
+        result = {}
+        for inst in instances:
+            valeurs = {}
+            
+            # Priorité aux valeurs des lignes de variables
+            for ligne in lignes_by_instance.get(inst['id'], ()):
+                var = variables_by_id.get(ligne['variable_id'])
+                if not var or not var['name']:
+                    continue
+                if ligne['valeur']:
+                    valeurs[var['name']] = ligne['valeur']
+                elif var['valeur_par_defaut']:
+                    valeurs[var['name']] = var['valeur_par_defaut']
+            
+            # Compléter avec les valeurs par défaut du template pour les variables manquantes
+            for var in variables_by_template.get(inst['template_id'], ()):
+                if var['name'] not in valeurs and var['valeur_par_defaut']:
+                    valeurs[var['name']] = var['valeur_par_defaut']
+            
+            # Si pas de valeurs dans les lignes, utiliser le JSON
+            if not valeurs and inst['valeurs_variables']:
+                try:
+                    valeurs = json.loads(inst['valeurs_variables'])
+                except ValueError:
+                    pass
+            
+            result[inst['id']] = valeurs
+        return result
     
     @api.model_create_multi
     def create(self, vals_list):
         """S'assure que toutes les variables sont créées lors de la création"""
         instances = super().create(vals_list)
         # S'assurer que toutes les variables sont présentes après création
-        for instance in instances:
-            if instance.template_id:
-                instance._ensure_all_variables_present()
+        instances._ensure_all_variables_present()
         return instances
     
     def write(self, vals):
@@ -202,9 +270,7 @@ class LettreMotivationInstance(models.Model):
         result = super().write(vals)
         # Si le template a changé, s'assurer que toutes les variables sont présentes
         if 'template_id' in vals:
-            for instance in self:
-                if instance.template_id:
-                    instance._ensure_all_variables_present()
+            self._ensure_all_variables_present()
         return result
     
     @api.onchange('template_id')
@@ -232,26 +298,48 @@ class LettreMotivationInstance(models.Model):
             self.variables_valeurs_ids = [(5, 0, 0)]
     
     def _ensure_all_variables_present(self):
-        """S'assure que toutes les variables du template sont présentes dans variables_valeurs_ids"""
-        if not self.template_id:
+        """
+        S'assure que toutes les variables du template sont présentes dans variables_valeurs_ids
+
+        Fonctionne sur tout le recordset : les variables des templates et les
+        lignes existantes sont lues en une requête chacune (en base, donc à jour
+        sans invalider le cache des templates) et les lignes manquantes sont
+        créées par un seul create groupé.
+        """
+        instances = self.filtered('template_id')
+        if not instances:
             return
         
-        # S'assurer que le template est chargé avec ses variables
-        self.template_id.invalidate_recordset(['variables_ids'])
+        template_vars = self.env['lettre.motivation.variable'].search_read(
+            [('template_id', 'in', instances.template_id.ids)],
+            ['template_id', 'valeur_par_defaut'],
+            load=None,
+        )
+        vars_by_template = {}
+        for var in template_vars:
+            vars_by_template.setdefault(var['template_id'], []).append(var)
         
-        # Récupérer les IDs des variables déjà présentes
-        existing_var_ids = set(self.variables_valeurs_ids.mapped('variable_id.id'))
+        # Couples (instance, variable) déjà présents
+        existing = {
+            (ligne['instance_id'], ligne['variable_id'])
+            for ligne in self.env['lettre.motivation.instance.variable'].search_read(
+                [('instance_id', 'in', instances.ids)],
+                ['instance_id', 'variable_id'],
+                load=None,
+            )
+        }
         
-        # Pour chaque variable du template, vérifier si elle est présente
-        missing_vars = []
-        for var_obj in self.template_id.variables_ids:
-            if var_obj.id and var_obj.id not in existing_var_ids:
-                missing_vars.append({
-                    'instance_id': self.id,
-                    'variable_id': var_obj.id,
-                    'valeur': var_obj.valeur_par_defaut or '',
-                    'sequence': 10,
-                })
+        missing_vars = [
+            {
+                'instance_id': instance.id,
+                'variable_id': var['id'],
+                'valeur': var['valeur_par_defaut'] or '',
+                'sequence': 10,
+            }
+            for instance in instances
+            for var in vars_by_template.get(instance.template_id.id, ())
+            if (instance.id, var['id']) not in existing
+        ]
         
         # Créer toutes les lignes manquantes en une seule fois
         if missing_vars:
@@ -260,11 +348,10 @@ class LettreMotivationInstance(models.Model):
     @api.constrains('variables_valeurs_ids', 'template_id')
     def _check_variables_valeurs_ids(self):
         """Vérifie que toutes les lignes ont un variable_id et essaie de le remplir automatiquement"""
+        # S'assurer que toutes les variables des templates sont présentes
+        self._ensure_all_variables_present()
         for record in self:
             if record.template_id:
-                # S'assurer que toutes les variables du template sont présentes
-                record._ensure_all_variables_present()
-                
                 for var_val in record.variables_valeurs_ids:
                     if not var_val.variable_id:
                         # Essayer de trouver la variable par son nom si disponible
@@ -309,22 +396,20 @@ class LettreMotivationInstance(models.Model):
         
         # Remplacer les variables dans le contenu
         try:
-            contenu = self.template_id.contenu
-            
+            template = self.template_id
+            # Valeurs indexées par clé normalisée ; la première valeur posée l'emporte
             # Traiter les tableaux (niveau 2 et 3)
-            for tableau in self.template_id.tableaux_ids:
-                var_name = tableau.variable_name
-                # Générer le HTML du tableau
-                tableau_html = self._generer_tableau_html(tableau)
-                # Remplacer toutes les occurrences de la variable du tableau
-                pattern = r'\{\{' + re.escape(var_name) + r'\}\}'
-                contenu = re.sub(pattern, tableau_html, contenu, flags=re.IGNORECASE)
+            lookup = {}
+            tableau_names = set()
+            for tableau in template.tableaux_ids:
+                tableau_names.add(tableau.variable_name)
+                # HTML déjà échappé : inséré tel quel
+                lookup.setdefault(placeholder_key(tableau.variable_name), Markup(self._generer_tableau_html(tableau)))
             
-            # Remplacer les variables simples
-            # Pour chaque variable définie dans le modèle
-            for var_obj in self.template_id.variables_ids:
+            # Variables simples : accessibles par nom technique et par libellé
+            for var_obj in template.variables_ids:
                 # Ignorer les variables de tableau (déjà traitées)
-                if any(t.variable_name == var_obj.name for t in self.template_id.tableaux_ids):
+                if var_obj.name in tableau_names:
                     continue
                 
                 # Récupérer la valeur (utiliser le nom technique comme clé)
@@ -334,29 +419,13 @@ class LettreMotivationInstance(models.Model):
                 elif var_obj.valeur_par_defaut:
                     var_value = str(var_obj.valeur_par_defaut)
                 
-                # Créer une liste de tous les patterns possibles à remplacer
-                patterns_to_replace = []
-                
-                # Ajouter le nom technique (exact et insensible à la casse)
-                patterns_to_replace.append((r'\{\{' + re.escape(var_obj.name) + r'\}\}', var_value))
-                
-                # Ajouter le libellé original si différent
+                lookup.setdefault(placeholder_key(var_obj.name), var_value)
                 if var_obj.label and var_obj.label != var_obj.name:
-                    patterns_to_replace.append((r'\{\{' + re.escape(var_obj.label) + r'\}\}', var_value))
-                
-                # Effectuer tous les remplacements
-                for pattern, replacement in patterns_to_replace:
-                    contenu = re.sub(pattern, replacement, contenu, flags=re.IGNORECASE)
+                    lookup.setdefault(placeholder_key(var_obj.label), var_value)
             
-            # Remplacer aussi toutes les variables restantes qui pourraient être dans le template
-            # mais qui n'ont pas de valeur (les remplacer par chaîne vide)
-            all_vars_in_template = re.findall(r'\{\{([^}]+?)\}\}', contenu)
-            for var_found in all_vars_in_template:
-                var_found = var_found.strip()
-                # Si cette variable n'a pas été remplacée, la remplacer par chaîne vide
-                if '{{' + var_found + '}}' in contenu:
-                    pattern = r'\{\{' + re.escape(var_found) + r'\}\}'
-                    contenu = re.sub(pattern, '', contenu)
+            # Rendu par la vue QWeb compilée (valeurs échappées) ; les variables
+            # sans valeur sont remplacées par une chaîne vide
+            contenu = template._render_contenu(lookup)
             
             self.contenu_final = contenu
             self.state = 'generated'
@@ -365,31 +434,35 @@ class LettreMotivationInstance(models.Model):
     
     def _generer_tableau_html(self, tableau):
         """Génère le HTML d'un tableau dynamique"""
-        html = '<table class="table table-bordered" style="width: 100%; border-collapse: collapse; margin: 20px 0;">\n'
+        return ''.join(self._iter_tableau_html(tableau))
+
+    def _iter_tableau_html(self, tableau):
+        """
+        Produit le HTML d'un tableau dynamique par morceaux
+
+        Les colonnes sont triées une seule fois et les lignes lues paresseusement
+        (voir lettre.motivation.tableau._iter_lignes) : le coût est linéaire en
+        nombre de lignes. Les morceaux peuvent être joints ou écrits dans un
+        fichier. Libellés et valeurs sont échappés.
+        """
+        colonnes = tableau.colonnes_ids.sorted('sequence')
+        yield '<table class="table table-bordered" style="width: 100%; border-collapse: collapse; margin: 20px 0;">\n'
         
         # En-tête
-        html += '  <thead>\n    <tr>\n'
-        for colonne in tableau.colonnes_ids.sorted('sequence'):
-            style = f'width: {colonne.width};' if colonne.width else ''
-            html += f'      <th style="{style} border: 1px solid #ddd; padding: 8px; background-color: #f2f2f2;">{colonne.label}</th>\n'
-        html += '    </tr>\n  </thead>\n'
-        
-        # Corps
-        html += '  <tbody>\n'
-        for ligne in tableau.lignes_ids.sorted('sequence'):
-            html += '    <tr>\n'
-            try:
-                valeurs = json.loads(ligne.valeurs)
-                for colonne in tableau.colonnes_ids.sorted('sequence'):
-                    valeur = valeurs.get(colonne.name, '')
-                    html += f'      <td style="border: 1px solid #ddd; padding: 8px;">{valeur}</td>\n'
-            except:
-                pass
-            html += '    </tr>\n'
-        html += '  </tbody>\n'
-        
-        html += '</table>'
-        return html
+        yield '  <thead>\n    <tr>\n'
+        for colonne in colonnes:
+            style = f'width: {escape(colonne.width)};' if colonne.width else ''
+            yield f'      <th style="{style} border: 1px solid #ddd; padding: 8px; background-color: #f2f2f2;">{escape(colonne.label)}</th>\n'
+        yield '    </tr>\n  </thead>\n'
+        
+        # Corps (une ligne au JSON invalide est rendue vide)
+        yield '  <tbody>\n'
+        cell = '      <td style="border: 1px solid #ddd; padding: 8px;">%s</td>\n'
+        for valeurs in tableau._iter_lignes(colonnes.mapped('name')):
+            yield '    <tr>\n%s    </tr>\n' % ''.join(cell % escape(valeur) for valeur in valeurs or ())
+        yield '  </tbody>\n'
+        
+        yield '</table>'
 
     def _auto_map_from_record(self, record, binding):
         """Mapper automatiquement les champs depuis un enregistrement Odoo"""
@@ -431,15 +504,10 @@ class LettreMotivationInstance(models.Model):
                     f"vers la variable {mapping.variable_id.name}: {str(e)}"
                 )
 
-    def _auto_map_from_sale_order(self, sale_order):
-        """Mapper automatiquement les champs depuis une commande de vente"""
-        self.ensure_one()
-        
-        if not sale_order:
-            return
-        
-        # Mapping basique des champs communs
-        common_mappings = {
+    @api.model
+    def _get_sale_order_mappings(self, sale_order):
+        """Valeurs des variables communes calculées depuis une commande de vente"""
+        return {
             'nom_client': sale_order.partner_id.name if sale_order.partner_id else '',
             'nom_commercial': sale_order.user_id.name if sale_order.user_id else '',
             'date_commande': sale_order.date_order.strftime('%d/%m/%Y') if sale_order.date_order else '',
@@ -449,17 +517,39 @@ class LettreMotivationInstance(models.Model):
             'email_client': sale_order.partner_id.email if sale_order.partner_id else '',
             'telephone_client': sale_order.partner_id.phone if sale_order.partner_id else '',
         }
+    
+    @api.model
+    def _match_sale_order_mapping(self, var_name, mappings):
+        """
+        Cherche la valeur d'une variable dans les mappings de commande
+        
+        Returns:
+            (trouvé, valeur) ; la valeur est toujours une chaîne
+        """
+        var_name = var_name.lower()
+        for mapping_key, mapping_value in mappings.items():
+            if var_name == mapping_key or var_name.replace('_', '') == mapping_key.replace('_', ''):
+                return True, str(mapping_value) if mapping_value else ''
+        return False, ''
+
+    def _auto_map_from_sale_order(self, sale_order):
+        """Mapper automatiquement les champs depuis une commande de vente"""
+        self.ensure_one()
+        
+        if not sale_order:
+            return
+        
+        # Mapping basique des champs communs
+        common_mappings = self._get_sale_order_mappings(sale_order)
         
         # Remplir les variables qui correspondent
         for var_val in self.variables_valeurs_ids:
             if var_val.variable_id and var_val.variable_id.name:
-                var_name = var_val.variable_id.name.lower()
-                # Chercher une correspondance
-                for mapping_key, mapping_value in common_mappings.items():
-                    if var_name == mapping_key or var_name.replace('_', '') == mapping_key.replace('_', ''):
-                        var_val.valeur = str(mapping_value) if mapping_value else ''
-                        break
+                found, value = self._match_sale_order_mapping(var_val.variable_id.name, common_mappings)
+                if found:
+                    var_val.valeur = value
 
+    @api.model
     def _format_partner_address(self, partner):
         """Formate l'adresse d'un partenaire"""
         if not partner:
@@ -479,11 +569,105 @@ class LettreMotivationInstance(models.Model):
         
         return ', '.join(parts)
 
+    def _get_format_sortie(self):
+        """Format de sortie effectif de la lettre"""
+        self.ensure_one()
+        return self.format_sortie or self.template_id.format_sortie or 'docx'
+
+    def _get_render_digest(self, format_sortie, valeurs=None):
+        """
+        Empreinte des entrées du rendu du fichier (clé du cache de rendu)
+
+        Couvre le modèle (id, write_date, checksum du fichier Word), le format et
+        le nom ; pour un template Word rendu en DOCX, les valeurs des variables,
+        la date du jour (``sysdate``) et le write_date de chaque enregistrement
+        que le template atteint depuis ``docs`` et ``company`` (partenaire,
+        lignes de commande...), sinon le contenu final (qui résulte déjà des
+        valeurs et des tableaux).
+
+        Args:
+            format_sortie: Format du fichier
+            valeurs: Valeurs des variables déjà chargées (voir _get_valeurs_dicts)
+
+        Returns:
+            Le digest hexadécimal, ou False si le contenu n'est pas encore généré
+            ou si le template appelle des méthodes d'enregistrement (entrées
+            inconnues : pas de mise en cache)
+        """
+        self.ensure_one()
+        template = self.template_id
+        use_word = bool(template.use_word_template and template.word_template)
+        payload = {
+            'template': [template.id, template.write_date, template._get_word_template_checksum() if use_word else None],
+            'format': format_sortie,
+            'name': self.name,
+        }
+        if use_word and format_sortie == 'docx':
+            references = template._get_template_references()
+            if references is None:
+                return False
+            write_dates = {}
+            for name, record in self._get_docx_render_records().items():
+                tree = self._get_reference_tree(references.get(name, ()))
+                if not self._can_snapshot(record._name, tree):
+                    return False
+                for model, record_id, write_date in self._get_reference_write_dates(record, tree):
+                    write_dates[f"{model},{record_id}"] = write_date
+            payload.update({
+                'values': sorted((valeurs if valeurs is not None else self.get_valeurs_dict()).items()),
+                'records': write_dates,
+                'lang': self._context.get('lang', 'fr_FR'),
+                'date': fields.Date.context_today(self),
+            })
+        elif self.contenu_final:
+            payload['contenu'] = self.contenu_final
+        else:
+            return False
+        serialized = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def _use_cached_fichier(self, digest, format_sortie):
+        """
+        Réutilise un rendu identique si possible
+
+        Returns:
+            True si la lettre a déjà ce fichier ou s'il a été copié depuis le cache
+        """
+        self.ensure_one()
+        if not digest:
+            return False
+        if digest == self.render_digest and self._get_fichier_attachment():
+            return True
+        cached = self.env['lettre.motivation.render.cache']._lookup(digest)
+        if not cached:
+            return False
+        self.with_context(lettre_render_digest=digest)._store_fichier(
+            cached.attachment_id.raw, f"{self.name.replace(' ', '_')}.{format_sortie}"
+        )
+        return True
+
     def action_generer_fichier(self):
-        """Génère le fichier dans le format choisi"""
+        """Génère le fichier dans le format choisi (ou le reprend du cache de rendu)"""
         self.ensure_one()
         
-        format_sortie = self.format_sortie or self.template_id.format_sortie or 'docx'
+        format_sortie = self._get_format_sortie()
+        digest = self._get_render_digest(format_sortie)
+        if self._use_cached_fichier(digest, format_sortie):
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Fichier généré'),
+                    'message': _('Le fichier est à jour (repris du cache de rendu).'),
+                    'type': 'success',
+                    'sticky': False,
+                }
+            }
+        return self.with_context(lettre_render_digest=digest)._generer_fichier(format_sortie)
+
+    def _generer_fichier(self, format_sortie):
+        """Rend le fichier dans le format demandé"""
+        self.ensure_one()
         
         # Pour les templates Word, on peut générer directement sans contenu_final
         # car le rendu se fait avec docxtpl
@@ -506,6 +690,155 @@ class LettreMotivationInstance(models.Model):
         else:  # pdf
             return self._generer_pdf()
 
+    def _prepare_render_job(self, valeurs=None):
+        """
+        Prépare un travail de rendu entièrement matérialisé pour le pool
+
+        Args:
+            valeurs: Valeurs des variables déjà chargées (voir _get_valeurs_dicts)
+
+        Returns:
+            (type, payload, extension) ou None si le rendu nécessite l'ORM
+            (template Word utilisant des méthodes d'enregistrement) et doit
+            rester dans le worker
+        """
+        self.ensure_one()
+        template = self.template_id
+        format_sortie = self.format_sortie or template.format_sortie or 'docx'
+        
+        if template.use_word_template and template.word_template and format_sortie == 'docx':
+            # 'docs' et 'company' figés en instantanés selon les références du template
+            values, materialised = self._get_docx_render_values(template._get_template_references(), valeurs)
+            if not materialised:
+                return None
+            # Les octets du fichier sont transmis une fois par template (voir _generer_fichiers_batch)
+            return ('docx_template', {
+                'checksum': template._get_word_template_checksum(),
+                'values': values,
+            }, 'docx')
+        
+        if not self.contenu_final:
+            return None
+        if format_sortie == 'pdf':
+            return ('pdf', {'html': self._get_pdf_html()}, 'pdf')
+        if format_sortie == 'docx':
+            return ('html_docx', {'html': self.contenu_final}, 'docx')
+        return None
+
+    def _generer_fichiers_batch(self, max_workers=None):
+        """
+        Génère les fichiers de plusieurs lettres via un pool de processus
+
+        Les contextes de rendu sont matérialisés dans le worker, rendus en
+        parallèle (ProcessPoolExecutor), puis les fichiers sont écrits en
+        retour. Les octets de chaque template Word sont transmis une seule
+        fois au pool, les travaux ne portant que son checksum. Les lettres non
+        éligibles au pool sont rendues ici même.
+
+        Args:
+            max_workers: Nombre de processus ; par défaut le paramètre
+                ``lettre_motivation.render_workers`` ou le nombre de CPU
+
+        Returns:
+            Dictionnaire {instance_id: message d'erreur} des lettres en échec
+        """
+        import os
+        from ..tools import render_pool
+        
+        if max_workers is None:
+            max_workers = int(self.env['ir.config_parameter'].sudo().get_param(
+                'lettre_motivation.render_workers', os.cpu_count() or 1
+            ))
+        
+        valeurs_by_instance = self._get_valeurs_dicts()
+        jobs = []
+        templates = {}
+        filenames = {}
+        digests = {}
+        serial = self.browse()
+        for instance in self:
+            # Rendu identique déjà en cache : pas de travail pour le pool
+            digest = instance._get_render_digest(instance._get_format_sortie(), valeurs_by_instance[instance.id])
+            if instance._use_cached_fichier(digest, instance._get_format_sortie()):
+                continue
+            digests[instance.id] = digest
+            job = instance._prepare_render_job(valeurs_by_instance[instance.id])
+            if job is None:
+                serial |= instance
+                continue
+            kind, payload, extension = job
+            if kind == 'docx_template' and payload['checksum'] not in templates:
+                templates[payload['checksum']] = instance.template_id._get_word_template_bytes()
+            jobs.append((instance.id, kind, payload))
+            filenames[instance.id] = f"{instance.name.replace(' ', '_')}.{extension}"
+        
+        errors = {}
+        for instance_id, (content, error) in render_pool.render_many(jobs, max_workers, templates).items():
+            if error:
+                errors[instance_id] = error
+                continue
+            self.browse(instance_id).with_context(
+                lettre_render_digest=digests[instance_id]
+            )._store_fichier(content, filenames[instance_id])
+        
+        for instance in serial:
+            try:
+                with self.env.cr.savepoint():
+                    instance.action_generer_fichier()
+            except Exception as e:
+                errors[instance.id] = str(e)
+        return errors
+
+    def _get_fichier_attachment(self):
+        """Pièce jointe du filestore portant le fichier généré"""
+        self.ensure_one()
+        return self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'fichier_genere'),
+            ('res_id', '=', self.id),
+        ], limit=1)
+
+    def _get_fichier_attachments(self):
+        """Pièces jointes des fichiers générés, en une requête : {instance_id: pièce jointe}"""
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'fichier_genere'),
+            ('res_id', 'in', self.ids),
+        ])
+        return {attachment.res_id: attachment for attachment in attachments}
+
+    def _store_fichier(self, content, filename):
+        """
+        Enregistre le fichier généré directement comme pièce jointe
+
+        Les octets sont écrits tels quels dans le filestore (champ ``raw``),
+        sans passer par un encodage base64 ; le filestore déduplique les
+        contenus identiques par checksum. Si le contexte porte le digest du
+        rendu (``lettre_render_digest``), le fichier est aussi mis en cache.
+
+        Args:
+            content: Octets du fichier
+            filename: Nom du fichier (l'extension détermine le type MIME)
+        """
+        self.ensure_one()
+        self._get_fichier_attachment().unlink()
+        self.env['ir.attachment'].sudo().create({
+            'name': filename,
+            'res_model': self._name,
+            'res_field': 'fichier_genere',
+            'res_id': self.id,
+            'type': 'binary',
+            'raw': content,
+            'mimetype': FILE_MIMETYPES.get(filename.rpartition('.')[2]),
+        })
+        self.invalidate_recordset(['fichier_genere'])
+        digest = self.env.context.get('lettre_render_digest') or False
+        if digest:
+            self.env['lettre.motivation.render.cache']._store(
+                digest, content, filename, FILE_MIMETYPES.get(filename.rpartition('.')[2])
+            )
+        self.write({'nom_fichier': filename, 'render_digest': digest})
+
     def _generer_html(self):
         """Génère un fichier HTML"""
         self.ensure_one()
@@ -527,8 +860,7 @@ class LettreMotivationInstance(models.Model):
 </body>
 </html>"""
         
-        self.fichier_genere = full_html.encode('utf-8')
-        self.nom_fichier = f"{self.name.replace(' ', '_')}.html"
+        self._store_fichier(full_html.encode('utf-8'), f"{self.name.replace(' ', '_')}.html")
         
         return {
             'type': 'ir.actions.client',
@@ -541,55 +873,204 @@ class LettreMotivationInstance(models.Model):
             }
         }
 
+    @api.model
+    def _get_reference_tree(self, paths):
+        """Arbre {champ: sous-arbre} des chemins d'attributs, ex. ('partner_id', 'name')"""
+        tree = {}
+        for path in paths:
+            level = tree
+            for name in path:
+                level = level.setdefault(name, {})
+        return tree
+
+    @api.model
+    def _prefetch_field_tree(self, records, tree):
+        """
+        Lit en lot les champs d'un arbre de références
+
+        Les champs stockés de chaque niveau sont lus pour tous les
+        enregistrements du lot de prefetch, puis les relations sont suivies
+        niveau par niveau : le rendu du template ne fait plus de requête.
+        """
+        if not records or not tree:
+            return
+        records = records | records.browse(list(islice(records._prefetch_ids, PREFETCH_MAX)))
+        fnames = [
+            name for name in tree
+            if name in records._fields and records._fields[name].store
+        ]
+        if not fnames:
+            return
+        try:
+            records.fetch(fnames)
+        except AccessError:
+            # Champ non autorisé : l'erreur sera signalée par le rendu lui-même
+            return
+        for name in fnames:
+            if tree[name] and records._fields[name].relational:
+                self._prefetch_field_tree(records.mapped(name), tree[name])
+
+    @api.model
+    def _can_snapshot(self, model_name, tree):
+        """
+        Indique si les références d'un arbre peuvent être figées en instantané
+
+        Toutes les références doivent être des champs (pas de méthode comme
+        ``mapped`` ou ``filtered``) ; les champs reference renvoient des
+        enregistrements non picklables et sont exclus.
+        """
+        model_fields = self.env[model_name]._fields
+        for name, subtree in tree.items():
+            field = model_fields.get(name)
+            if field is None or field.type == 'reference':
+                return False
+            if field.relational and not self._can_snapshot(field.comodel_name, subtree):
+                return False
+        return True
+
+    @api.model
+    def _snapshot_records(self, records, tree):
+        """
+        Fige les champs référencés d'enregistrements en instantanés picklables
+
+        Returns:
+            Liste de RecordSnapshot, dans l'ordre des enregistrements
+        """
+        from ..tools.docx_context import RecordSnapshot
+
+        values_by_id = {record.id: {'id': record.id} for record in records}
+        for name, subtree in tree.items():
+            field = records._fields[name]
+            if not field.relational:
+                for record in records:
+                    values_by_id[record.id][name] = record[name]
+                continue
+            targets = records.mapped(name)
+            snapshots = dict(zip(targets.ids, self._snapshot_records(targets, subtree)))
+            for record in records:
+                related = record[name]
+                if field.type == 'many2one':
+                    values_by_id[record.id][name] = (
+                        snapshots[related.id] if related else self._empty_snapshot(related, subtree)
+                    )
+                else:
+                    values_by_id[record.id][name] = [snapshots[related_id] for related_id in related.ids]
+        return [RecordSnapshot(records._name, record.id, values_by_id[record.id]) for record in records]
+
+    @api.model
+    def _empty_snapshot(self, records, tree):
+        """Instantané d'un many2one vide : les champs référencés valent False ou vide"""
+        from ..tools.docx_context import RecordSnapshot
+
+        values = {'id': False}
+        for name, subtree in tree.items():
+            field = records._fields[name]
+            if field.type == 'many2one':
+                values[name] = self._empty_snapshot(records[name], subtree)
+            elif field.relational:
+                values[name] = []
+            else:
+                values[name] = False
+        return RecordSnapshot(records._name, False, values)
+
+    @api.model
+    def _get_reference_write_dates(self, records, tree):
+        """
+        (modèle, id, write_date) des enregistrements atteints par un arbre de références
+
+        Les relations de l'arbre sont suivies niveau par niveau, en lot.
+        """
+        result = [(records._name, record.id, record.write_date) for record in records]
+        for name, subtree in tree.items():
+            field = records._fields.get(name)
+            if field is not None and field.relational:
+                result += self._get_reference_write_dates(records.mapped(name), subtree)
+        return result
+
+    def _get_docx_render_records(self):
+        """Enregistrements exposés aux templates Word : ``company`` et ``docs`` (commande)"""
+        self.ensure_one()
+        records = {'company': self.env.company}
+        if self.sale_order_id:
+            records['docs'] = self.sale_order_id
+        return records
+
+    def _get_docx_render_values(self, references, valeurs=None):
+        """
+        Valeurs de rendu d'un template Word, hors fonctions utilitaires
+
+        ``docs`` (la commande, comme dans alnas-docx) et ``company`` sont
+        chargés en lot selon les références du template puis figés en
+        instantanés picklables : le rendu en série et le rendu dans le pool
+        reçoivent exactement les mêmes valeurs. Si le template utilise autre
+        chose que des champs (méthodes, template non analysable), les
+        enregistrements eux-mêmes sont passés et le rendu doit rester ici.
+
+        Args:
+            references: Références du template (voir _get_template_references)
+            valeurs: Valeurs des variables déjà chargées (voir _get_valeurs_dicts)
+
+        Returns:
+            (valeurs, True si elles sont entièrement matérialisées)
+        """
+        self.ensure_one()
+        records = self._get_docx_render_records()
+        trees = {
+            name: self._get_reference_tree(references.get(name, ()) if references else ())
+            for name in records
+        }
+        materialised = references is not None and all(
+            self._can_snapshot(records[name]._name, trees[name]) for name in records
+        )
+        
+        values = {
+            "lang": self._context.get("lang", "fr_FR"),
+            "sysdate": fields.Datetime.now(),
+        }
+        for name, record in records.items():
+            self._prefetch_field_tree(record, trees[name])
+            values[name] = self._snapshot_records(record, trees[name])[0] if materialised else record
+        values.update(valeurs if valeurs is not None else self.get_valeurs_dict())
+        return values, materialised
+
+    def _get_docx_render_context(self, doc):
+        """
+        Contexte de rendu d'un template Word
+
+        Mêmes valeurs que pour le rendu dans le pool (voir
+        _get_docx_render_values), plus les seules fonctions utilitaires
+        référencées par le template.
+
+        Args:
+            doc: DocxTemplate à rendre
+
+        Returns:
+            (contexte, valeurs des variables personnalisées)
+        """
+        self.ensure_one()
+        from ..tools import misc as misc_tools
+        
+        references = self.template_id._get_template_references(doc)
+        valeurs = self.get_valeurs_dict()
+        context = self._get_docx_render_values(references, valeurs)[0]
+        context.update(misc_tools.get_template_helpers(doc, references))
+        return context, valeurs
+
     def _generer_docx(self):
         """Génère un fichier DOCX"""
         self.ensure_one()
         
         try:
-            import base64
             from io import BytesIO
-            from docxtpl import DocxTemplate
             from docx import Document
             
             # Vérifier si le template a un fichier Word
             if self.template_id.use_word_template and self.template_id.word_template:
-                # Utiliser le template Word
-                docx_bytes = base64.b64decode(self.template_id.word_template)
-                docx_io = BytesIO(docx_bytes)
-                doc = DocxTemplate(docx_io)
-                
-                # Préparer le contexte - comme alnas-docx, passer 'docs' pour compatibilité
-                context = {}
+                # Utiliser le template Word (octets repris du cache, document analysé une fois)
+                doc = self.template_id._get_docx_template()
                 
-                # Ajouter 'docs' si sale_order_id existe (comme dans alnas-docx)
-                if self.sale_order_id:
-                    context['docs'] = self.sale_order_id
-                
-                # Ajouter les fonctions utilitaires locales
-                from ..tools import misc as misc_tools
-                from functools import partial
-                context.update({
-                    "company": self.env.company,
-                    "lang": self._context.get("lang", "fr_FR"),
-                    "sysdate": fields.Datetime.now(),
-                    "spelled_out": misc_tools.spelled_out,
-                    "parsehtml": misc_tools.parse_html,
-                    "formatdate": misc_tools.formatdate,
-                    "convert_currency": misc_tools.convert_currency,
-                    "formatabs": misc_tools.format_abs,
-                    "rich_text": misc_tools.rich_text,
-                    "render_image": partial(misc_tools.render_image, doc),
-                    "html2docx": partial(misc_tools.render_html_as_subdoc, doc),
-                    "add_subdoc": partial(misc_tools.add_new_subdoc, doc),
-                    "replace_image": partial(misc_tools.replace_image, doc),
-                    "replace_media": partial(misc_tools.replace_media, doc),
-                    "replace_embedded": partial(misc_tools.replace_embedded, doc),
-                    "replace_zipname": partial(misc_tools.replace_zipname, doc),
-                })
-                
-                # Ajouter les autres variables personnalisées
-                valeurs = self.get_valeurs_dict()
-                context.update(valeurs)
+                # Contexte limité aux noms utilisés, champs lus en lot avant le rendu
+                context, valeurs = self._get_docx_render_context(doc)
                 
                 # Rendre le template avec gestion d'erreur améliorée
                 try:
@@ -622,10 +1103,8 @@ class LettreMotivationInstance(models.Model):
                 # Sauvegarder dans un BytesIO
                 output = BytesIO()
                 doc.save(output)
-                output.seek(0)
                 
-                self.fichier_genere = base64.b64encode(output.read())
-                self.nom_fichier = f"{self.name.replace(' ', '_')}.docx"
+                self._store_fichier(output.getvalue(), f"{self.name.replace(' ', '_')}.docx")
             else:
                 # Créer un nouveau document DOCX depuis le HTML
                 from htmldocx import HtmlToDocx
@@ -636,10 +1115,8 @@ class LettreMotivationInstance(models.Model):
                 
                 output = BytesIO()
                 doc.save(output)
-                output.seek(0)
                 
-                self.fichier_genere = base64.b64encode(output.read())
-                self.nom_fichier = f"{self.name.replace(' ', '_')}.docx"
+                self._store_fichier(output.getvalue(), f"{self.name.replace(' ', '_')}.docx")
             
             return {
                 'type': 'ir.actions.client',
@@ -656,56 +1133,26 @@ class LettreMotivationInstance(models.Model):
         except Exception as e:
             raise UserError(_('Erreur lors de la génération du fichier DOCX: %s') % str(e))
 
+    def _get_pdf_html(self):
+        """Document HTML complet passé à WeasyPrint (styles d'impression ajoutés au rendu)"""
+        self.ensure_one()
+        from ..tools import pdf_renderer
+        return pdf_renderer.letter_html(self.contenu_final or '')
+
     def _generer_pdf(self):
         """Génère un fichier PDF"""
         self.ensure_one()
         
         try:
-            from weasyprint import HTML
-            from io import BytesIO
-            import base64
+            from ..tools import pdf_renderer
             
             # Créer un HTML complet pour WeasyPrint
-            html_content = self.contenu_final or ''
-            full_html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <style>
-        @page {{
-            size: A4;
-            margin: 2cm;
-        }}
-        body {{
-            font-family: Arial, sans-serif;
-            line-height: 1.6;
-        }}
-        table {{
-            width: 100%;
-            border-collapse: collapse;
-            margin: 10px 0;
-        }}
-        table td, table th {{
-            border: 1px solid #ddd;
-            padding: 8px;
-        }}
-        table th {{
-            background-color: #f2f2f2;
-        }}
-    </style>
-</head>
-<body>
-{html_content}
-</body>
-</html>"""
+            full_html = self._get_pdf_html()
             
-            # Générer le PDF
-            pdf_bytes = BytesIO()
-            HTML(string=full_html).write_pdf(pdf_bytes)
-            pdf_bytes.seek(0)
+            # Générer le PDF (polices et feuille de style partagées par le worker)
+            pdf_bytes = pdf_renderer.render_pdf(full_html)
             
-            self.fichier_genere = base64.b64encode(pdf_bytes.read())
-            self.nom_fichier = f"{self.name.replace(' ', '_')}.pdf"
+            self._store_fichier(pdf_bytes, f"{self.name.replace(' ', '_')}.pdf")
             
             return {
                 'type': 'ir.actions.client',
@@ -741,17 +1188,120 @@ class LettreMotivationInstance(models.Model):
             else:
                 raise UserError(_('Erreur lors de la génération du fichier PDF: %s') % error_msg)
 
+    def _iter_contenus_finaux(self):
+        """Contenus finaux des lettres, lus par lots et retirés du cache ensuite"""
+        for batch_ids in split_every(MERGE_READ_BATCH_SIZE, self.ids):
+            batch = self.browse(batch_ids)
+            for values in batch.read(['contenu_final']):
+                yield values['contenu_final']
+            batch.invalidate_recordset(['contenu_final'])
+
+    def _iter_fichiers_docx(self):
+        """Octets des fichiers DOCX des lettres, lus un par un (pièces jointes cherchées en une fois)"""
+        attachments = self._get_fichier_attachments()
+        for instance in self:
+            attachment = attachments[instance.id]
+            yield attachment.raw
+            attachment.invalidate_recordset(['raw'])
+
+    def _create_fusion(self, fileobj, extension):
+        """Enregistre le fichier fusionné et renvoie l'action de téléchargement"""
+        fusion = self.env['lettre.motivation.fusion'].create({'instance_ids': [(6, 0, self.ids)]})
+        fusion._store_fichier(
+            fileobj, _('lettres_fusionnees_%s.%s') % (len(self), extension), FILE_MIMETYPES[extension]
+        )
+        return fusion.action_telecharger()
+
+    def action_fusionner_pdf(self):
+        """
+        Fusionne les lettres sélectionnées en un seul PDF (une lettre par page)
+
+        Toutes les lettres sont mises en page dans un seul document WeasyPrint,
+        écrit dans un fichier temporaire puis enregistré comme pièce jointe
+        d'une fusion (lettre.motivation.fusion). Les lettres à
+        template Word sont refusées : seule la fusion DOCX les restitue.
+        """
+        if not self:
+            raise UserError(_('Aucune lettre sélectionnée!'))
+        # Le contenu des lettres à template Word n'est qu'un texte d'attente
+        lettres_word = self.filtered(
+            lambda l: l.template_id.use_word_template and l.template_id.word_template
+        )
+        if lettres_word:
+            raise UserError(_(
+                'Les lettres suivantes utilisent un template Word et ne peuvent être '
+                'fusionnées qu\'en DOCX (Fusionner en DOCX) :\n%s'
+            ) % '\n'.join(lettres_word.mapped('name')))
+        sans_contenu = self.filtered(lambda l: not l.contenu_final)
+        if sans_contenu:
+            raise UserError(_(
+                'Veuillez d\'abord générer le contenu des lettres suivantes :\n%s'
+            ) % '\n'.join(sans_contenu.mapped('name')))
+        
+        try:
+            from ..tools import pdf_renderer
+            
+            with tempfile.TemporaryFile() as output:
+                pdf_renderer.render_letters_pdf(self._iter_contenus_finaux(), output)
+                return self._create_fusion(output, 'pdf')
+        except ImportError:
+            raise UserError(_('La bibliothèque WeasyPrint n\'est pas installée.'))
+
+    def action_fusionner_docx(self):
+        """
+        Fusionne les fichiers DOCX des lettres sélectionnées (docxcompose)
+
+        Les lettres au format DOCX sans fichier sont d'abord générées en lot
+        (pool de rendu, voir _generer_fichiers_batch) ; chaque fichier est lu
+        au moment de son ajout au document fusionné.
+        """
+        if not self:
+            raise UserError(_('Aucune lettre sélectionnée!'))
+        
+        attachments = self._get_fichier_attachments()
+        
+        def has_docx(instance):
+            return bool(instance.nom_fichier and instance.nom_fichier.endswith('.docx')
+                        and instance.id in attachments)
+        
+        sans_docx = self.filtered(lambda l: not has_docx(l) and l._get_format_sortie() != 'docx')
+        if sans_docx:
+            raise UserError(_(
+                'Les lettres suivantes n\'ont pas de fichier DOCX :\n%s'
+            ) % '\n'.join(sans_docx.mapped('name')))
+        a_generer = self.filtered(lambda l: not has_docx(l))
+        errors = a_generer._generer_fichiers_batch() if a_generer else {}
+        if errors:
+            raise UserError(_(
+                'La génération des lettres suivantes a échoué :\n%s'
+            ) % '\n'.join(
+                '%s : %s' % (instance.name, errors[instance.id])
+                for instance in self.browse(list(errors))
+            ))
+        
+        try:
+            from ..tools import docx_merge
+            
+            with tempfile.TemporaryFile() as output:
+                docx_merge.merge_docx(self._iter_fichiers_docx(), output)
+                return self._create_fusion(output, 'docx')
+        except ImportError:
+            raise UserError(_('La bibliothèque docxcompose n\'est pas installée. Installez-la avec: pip install docxcompose'))
+
     def action_telecharger(self):
         """Télécharge le fichier généré"""
         self.ensure_one()
-        if not self.fichier_genere:
+        # Vérifier la pièce jointe sans charger le fichier en mémoire
+        if not self._get_fichier_attachment():
             raise UserError(_('Aucun fichier généré!'))
         
+        # /web/content sert le fichier depuis le filestore (X-Sendfile si
+        # activé, requêtes Range et cache conditionnel via ETag/checksum)
         return {
             'type': 'ir.actions.act_url',
-            'url': '/web/content/lettre.motivation.instance/%s/fichier_genere/%s' % (
+            'url': '/web/content/lettre.motivation.instance/%s/fichier_genere/%s?download=true' % (
                 self.id,
-                self.nom_fichier or 'lettre.pdf'
+                url_quote(self.nom_fichier or 'lettre.pdf')
             ),
             'target': 'self',
         }
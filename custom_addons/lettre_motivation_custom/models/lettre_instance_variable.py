@@ -14,6 +14,7 @@ class LettreMotivationInstanceVariable(models.Model):
         'lettre.motivation.instance',
         string='Instance',
         required=True,
+        index=True,
         ondelete='cascade'
     )
 
@@ -48,44 +49,78 @@ class LettreMotivationInstanceVariable(models.Model):
     @api.model_create_multi
     def create(self, vals_list):
         """S'assure que variable_id est toujours défini"""
-        for vals in vals_list:
-            # Si variable_id n'est pas défini, essayer de le trouver
-            if not vals.get('variable_id'):
-                variable = None
+        to_resolve = [vals for vals in vals_list if not vals.get('variable_id')]
+        if to_resolve:
+            template_by_instance, by_template_name, first_by_template, by_name = \
+                self._get_variable_lookup(to_resolve)
+            for vals in to_resolve:
+                variable_id = False
+                name = vals.get('name')
                 
-                # Méthode 1: Chercher par instance_id et name si instance_id est fourni
-                if vals.get('instance_id'):
-                    instance = self.env['lettre.motivation.instance'].browse(vals.get('instance_id'))
-                    if instance.exists() and instance.template_id:
-                        # Chercher par name si fourni
-                        if vals.get('name'):
-                            variable = instance.template_id.variables_ids.filtered(
-                                lambda v: v.name == vals.get('name')
-                            )
-                            if variable:
-                                variable = variable[0]
-                        # Si pas de name, prendre la première variable disponible (ne devrait pas arriver)
-                        elif instance.template_id.variables_ids:
-                            variable = instance.template_id.variables_ids[0]
+                # Méthode 1: Chercher dans le modèle de l'instance, par name si fourni
+                template_id = template_by_instance.get(vals.get('instance_id'))
+                if template_id:
+                    if name:
+                        variable_id = by_template_name.get((template_id, name))
+                    # Si pas de name, prendre la première variable disponible (ne devrait pas arriver)
+                    else:
+                        variable_id = first_by_template.get(template_id)
                 
                 # Méthode 2: Chercher par name dans toutes les variables (fallback)
-                if not variable and vals.get('name'):
-                    variable = self.env['lettre.motivation.variable'].search([
-                        ('name', '=', vals.get('name'))
-                    ], limit=1)
+                if not variable_id and name:
+                    variable_id = by_name.get(name)
                 
-                # Si on a trouvé une variable, l'assigner
-                if variable:
-                    vals['variable_id'] = variable.id
-                else:
+                if not variable_id:
                     # Si on ne peut pas trouver la variable, lever une erreur
                     raise ValidationError(_(
                         'Impossible de trouver la variable. '
                         'Assurez-vous que le modèle est sélectionné et que les variables sont définies.'
                     ))
+                vals['variable_id'] = variable_id
         
         return super().create(vals_list)
     
+    @api.model
+    def _get_variable_lookup(self, vals_list):
+        """
+        Tables de résolution des variables pour un lot de lignes sans variable_id
+
+        Une requête pour les modèles des instances, une pour les variables
+        candidates (des modèles concernés ou portant un des noms demandés).
+
+        Returns:
+            Tuple de dictionnaires ({instance_id: template_id},
+            {(template_id, nom): variable_id}, {template_id: première variable_id},
+            {nom: variable_id})
+        """
+        instance_ids = {vals['instance_id'] for vals in vals_list if vals.get('instance_id')}
+        names = {vals['name'] for vals in vals_list if vals.get('name')}
+        
+        template_by_instance = {
+            inst['id']: inst['template_id']
+            for inst in self.env['lettre.motivation.instance'].browse(instance_ids).exists().read(
+                ['template_id'], load=None
+            )
+        }
+        template_ids = {tid for tid in template_by_instance.values() if tid}
+        
+        by_template_name, first_by_template, by_name = {}, {}, {}
+        if not template_ids and not names:
+            return template_by_instance, by_template_name, first_by_template, by_name
+        
+        variables = self.env['lettre.motivation.variable'].search_read(
+            ['|', ('template_id', 'in', list(template_ids)), ('name', 'in', list(names))],
+            ['template_id', 'name'],
+            order='name, id',
+            load=None,
+        )
+        for var in variables:
+            if var['template_id'] in template_ids:
+                by_template_name.setdefault((var['template_id'], var['name']), var['id'])
+                first_by_template.setdefault(var['template_id'], var['id'])
+            by_name.setdefault(var['name'], var['id'])
+        return template_by_instance, by_template_name, first_by_template, by_name
+    
     def write(self, vals):
         """S'assure que variable_id reste défini lors de la mise à jour"""
         # Si on essaie de supprimer variable_id, l'empêcher
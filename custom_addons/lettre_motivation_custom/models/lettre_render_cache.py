@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import timedelta
+
+from psycopg2 import IntegrityError
+
+from odoo import models, fields, api
+from odoo.tools import mute_logger
+
+_logger = logging.getLogger(__name__)
+
+# Valeurs par défaut (surchargées par les paramètres système)
+RENDER_CACHE_TTL_DAYS = 30
+RENDER_CACHE_MAX_ENTRIES = 1000
+
+# Délai minimum entre deux mises à jour de last_used d'une entrée
+RENDER_CACHE_TOUCH_MINUTES = 10
+
+
+class LettreMotivationRenderCache(models.Model):
+    """
+    Cache des fichiers rendus, adressé par le digest des entrées du rendu
+
+    Le digest couvre le modèle (id, write_date, checksum du fichier Word), les
+    valeurs et le format de sortie (voir lettre.motivation.instance._get_render_digest).
+    Les fichiers sont des pièces jointes du filestore, dédupliquées par checksum
+    avec celles des lettres.
+    """
+    _name = 'lettre.motivation.render.cache'
+    _description = 'Cache de Rendu des Lettres'
+    _order = 'last_used desc'
+
+    digest = fields.Char(
+        string='Digest',
+        required=True,
+        index=True,
+        readonly=True
+    )
+
+    attachment_id = fields.Many2one(
+        'ir.attachment',
+        string='Fichier',
+        required=True,
+        ondelete='cascade',
+        readonly=True
+    )
+
+    last_used = fields.Datetime(
+        string='Dernière Utilisation',
+        default=fields.Datetime.now,
+        readonly=True
+    )
+
+    hit_count = fields.Integer(
+        string='Utilisations',
+        default=0,
+        readonly=True
+    )
+
+    _sql_constraints = [
+        ('digest_unique', 'unique(digest)', 'Un rendu ne peut être mis en cache qu\'une fois.'),
+    ]
+
+    @api.model
+    def _lookup(self, digest):
+        """
+        Retourne l'entrée du cache pour ce digest
+
+        L'entrée n'est marquée comme utilisée (last_used, hit_count) que si sa
+        dernière utilisation date de plus de RENDER_CACHE_TOUCH_MINUTES : une
+        lecture ne prend donc pas systématiquement un verrou d'écriture sur la
+        ligne. hit_count compte ces utilisations espacées.
+        """
+        entry = self.sudo().search([('digest', '=', digest)], limit=1)
+        now = fields.Datetime.now()
+        if entry and (not entry.last_used or entry.last_used < now - timedelta(minutes=RENDER_CACHE_TOUCH_MINUTES)):
+            entry.write({
+                'last_used': now,
+                'hit_count': entry.hit_count + 1,
+            })
+        return entry
+
+    @api.model
+    def _store(self, digest, content, filename, mimetype=None):
+        """
+        Met en cache les octets d'un rendu (sans effet si le digest existe déjà)
+
+        Deux transactions peuvent rendre la même lettre en même temps : la
+        seconde insertion viole l'unicité du digest et est annulée seule,
+        dans un savepoint.
+        """
+        cache = self.sudo()
+        if cache.search_count([('digest', '=', digest)], limit=1):
+            return
+        try:
+            with mute_logger('odoo.sql_db'), self.env.cr.savepoint():
+                attachment = self.env['ir.attachment'].sudo().create({
+                    'name': filename,
+                    'res_model': self._name,
+                    'type': 'binary',
+                    'raw': content,
+                    'mimetype': mimetype,
+                })
+                cache.create({'digest': digest, 'attachment_id': attachment.id})
+        except IntegrityError:
+            _logger.debug("Rendu %s déjà mis en cache par une autre transaction", digest)
+
+    def unlink(self):
+        """Supprime aussi les pièces jointes (le fichier du filestore reste partagé)"""
+        attachments = self.attachment_id
+        result = super().unlink()
+        attachments.sudo().unlink()
+        return result
+
+    @api.model
+    def _cron_evict(self):
+        """
+        Éviction des rendus en cache
+
+        Supprime les entrées non utilisées depuis ``lettre_motivation.render_cache_ttl_days``
+        jours, puis les moins récemment utilisées au-delà de
+        ``lettre_motivation.render_cache_size`` entrées.
+        """
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        ttl_days = int(get_param('lettre_motivation.render_cache_ttl_days', RENDER_CACHE_TTL_DAYS))
+        max_entries = int(get_param('lettre_motivation.render_cache_size', RENDER_CACHE_MAX_ENTRIES))
+
+        cache = self.sudo()
+        expired = cache.search([('last_used', '<', fields.Datetime.now() - timedelta(days=ttl_days))])
+        overflow = cache.search([('id', 'not in', expired.ids)], offset=max_entries, order='last_used desc, id desc')
+        to_remove = expired | overflow
+        if to_remove:
+            _logger.info("Cache de rendu : %d entrée(s) supprimée(s)", len(to_remove))
+            to_remove.unlink()
@@ -1,6 +1,15 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from odoo.tools import split_every
+import json
+
+# Nombre de lignes créées par appel à create lors d'une conversion de stockage
+TABLEAU_CONVERSION_BATCH_SIZE = 1000
+
+# Nombre de lignes lues à la fois lors du rendu d'un tableau stocké par lignes
+TABLEAU_READ_BATCH_SIZE = 1000
 
 
 class LettreMotivationTableau(models.Model):
@@ -55,11 +64,123 @@ class LettreMotivationTableau(models.Model):
         help='Source Excel pour remplir automatiquement le tableau (niveau 3)'
     )
 
+    mode_stockage = fields.Selection(
+        [
+            ('lignes', 'Une Ligne par Enregistrement'),
+            ('colonnes', 'Colonnes Compactes'),
+        ],
+        string='Stockage des Données',
+        required=True,
+        default='lignes',
+        help='Colonnes compactes : toutes les données du tableau dans un seul '
+             'champ JSONB, adapté aux grands tableaux importés'
+    )
+
+    donnees_colonnes = fields.Json(
+        string='Données (Colonnes)',
+        copy=True,
+        help='Données en colonnes : {"nb_lignes": n, "colonnes": {"colonne": [v1, v2, ...]}}'
+    )
+
+    nb_lignes = fields.Integer(
+        string='Nombre de Lignes',
+        compute='_compute_nb_lignes',
+        help='Nombre de lignes de données du tableau'
+    )
+
     active = fields.Boolean(
         string='Actif',
         default=True
     )
 
+    @api.depends('mode_stockage', 'donnees_colonnes', 'lignes_ids')
+    def _compute_nb_lignes(self):
+        for tableau in self:
+            if tableau.mode_stockage == 'colonnes':
+                tableau.nb_lignes = (tableau.donnees_colonnes or {}).get('nb_lignes', 0)
+            else:
+                tableau.nb_lignes = len(tableau.lignes_ids)
+
+    def _set_donnees_colonnes(self, colonnes):
+        """
+        Enregistre toutes les données du tableau en un seul champ (mode colonnes)
+
+        Args:
+            colonnes: Dictionnaire {nom_colonne: [valeurs]} de listes de même longueur
+        """
+        self.ensure_one()
+        nb_lignes = max((len(values) for values in colonnes.values()), default=0)
+        self.donnees_colonnes = {'nb_lignes': nb_lignes, 'colonnes': colonnes}
+
+    def _iter_lignes(self, column_names):
+        """
+        Itère paresseusement sur les lignes du tableau, quel que soit le stockage
+
+        Args:
+            column_names: Noms des colonnes à extraire, dans l'ordre voulu
+
+        Yields:
+            Liste des valeurs (alignée sur column_names) par ligne, ou None pour
+            une ligne dont le JSON est invalide
+        """
+        self.ensure_one()
+        if self.mode_stockage == 'colonnes':
+            data = self.donnees_colonnes or {}
+            nb_lignes = data.get('nb_lignes', 0)
+            colonnes = data.get('colonnes', {})
+            # Colonnes complétées à nb_lignes : une colonne absente ou plus
+            # courte donne des cellules vides, sans tronquer le tableau
+            valeurs = [colonnes.get(name) or [] for name in column_names]
+            for index in range(nb_lignes):
+                yield [values[index] if index < len(values) else '' for values in valeurs]
+            return
+        
+        # Lecture par lots : seuls les identifiants sont chargés en une fois
+        Ligne = self.env['lettre.motivation.tableau.ligne']
+        ligne_ids = Ligne.search([('tableau_id', '=', self.id)], order='sequence, id').ids
+        for batch_ids in split_every(TABLEAU_READ_BATCH_SIZE, ligne_ids):
+            for ligne in Ligne.browse(batch_ids).read(['valeurs']):
+                try:
+                    valeurs = json.loads(ligne['valeurs'])
+                except (TypeError, ValueError):
+                    yield None
+                    continue
+                if not isinstance(valeurs, dict):
+                    # JSON valide mais pas un objet (liste, nombre...) : cellules vides
+                    yield [''] * len(column_names)
+                    continue
+                yield [valeurs.get(name, '') for name in column_names]
+            Ligne.invalidate_model(['valeurs'])
+
+    def action_convertir_stockage(self):
+        """Bascule le tableau entre le stockage par lignes et le stockage en colonnes"""
+        Ligne = self.env['lettre.motivation.tableau.ligne']
+        for tableau in self:
+            column_names = tableau.colonnes_ids.mapped('name')
+            if tableau.mode_stockage == 'lignes':
+                colonnes = {name: [] for name in column_names}
+                for row in tableau._iter_lignes(column_names):
+                    for name, value in zip(column_names, row or [''] * len(column_names)):
+                        colonnes[name].append(value)
+                tableau.lignes_ids.unlink()
+                tableau._set_donnees_colonnes(colonnes)
+                tableau.mode_stockage = 'colonnes'
+            else:
+                vals_list = []
+                for sequence, row in enumerate(tableau._iter_lignes(column_names), start=1):
+                    vals_list.append({
+                        'tableau_id': tableau.id,
+                        'sequence': sequence,
+                        'valeurs': json.dumps(dict(zip(column_names, row)), ensure_ascii=False),
+                    })
+                    if len(vals_list) >= TABLEAU_CONVERSION_BATCH_SIZE:
+                        Ligne.create(vals_list)
+                        vals_list = []
+                if vals_list:
+                    Ligne.create(vals_list)
+                tableau.write({'mode_stockage': 'lignes', 'donnees_colonnes': False})
+        return True
+
 
 class LettreMotivationTableauColonne(models.Model):
     """Colonne d'un tableau dynamique"""
@@ -136,7 +257,6 @@ class LettreMotivationTableauLigne(models.Model):
     @api.constrains('valeurs')
     def _check_valeurs_json(self):
         """Vérifie que les valeurs sont au format JSON valide"""
-        import json
         for record in self:
             if record.valeurs:
                 try:
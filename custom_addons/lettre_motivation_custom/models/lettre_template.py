@@ -2,7 +2,150 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+import logging
 import re
+import threading
+from collections import OrderedDict
+
+from lxml import etree, html as lxml_html
+from markupsafe import escape
+
+_logger = logging.getLogger(__name__)
+
+# Placeholders {{variable}} : tout ce qui est entre {{ et }} sauf les accolades fermantes
+PLACEHOLDER_PATTERN = re.compile(r'\{\{([^}]+?)\}\}')
+
+# Suites de caractères spéciaux (espaces, apostrophes...) et d'underscores d'un libellé
+VARIABLE_NAME_SEPARATORS = re.compile(r'[\W_]+')
+
+# Nombre maximum de templates compilés gardés en mémoire par worker
+COMPILED_TEMPLATE_CACHE_SIZE = 256
+
+# Cache LRU des templates compilés : {(dbname, template_id): ((write_date, hash_contenu), tokens)}
+_compiled_template_cache = OrderedDict()
+
+# Protège le cache, partagé par les threads du serveur threadé
+_compiled_template_lock = threading.Lock()
+
+# Contenus dont la conversion QWeb a échoué : {(dbname, template_id): hash_contenu}
+# (le rendu passe directement par les tokens, sans retenter la conversion)
+_qweb_failures = OrderedDict()
+
+# Protège le cache des échecs de conversion
+_qweb_failures_lock = threading.Lock()
+
+
+def placeholder_key(name):
+    """Clé de recherche d'un placeholder (insensible à la casse et aux espaces)"""
+    return name.strip().casefold()
+
+
+def variable_name_from_label(label):
+    """Nom technique d'une variable à partir de son libellé (ex: "Nom du candidat" -> nom_du_candidat)"""
+    return VARIABLE_NAME_SEPARATORS.sub('_', label).strip('_').lower()
+
+
+def extract_variables(content):
+    """
+    Extrait les variables {{...}} d'un contenu en une seule passe
+
+    Returns:
+        Dictionnaire ordonné {nom_technique: libellé_original}, le premier
+        libellé rencontré pour un nom technique étant conservé
+    """
+    variables = {}
+    for match in PLACEHOLDER_PATTERN.finditer(content or ''):
+        label = match.group(1).strip()
+        if label:
+            name = variable_name_from_label(label)
+            if name:
+                variables.setdefault(name, label)
+    return variables
+
+
+def _qweb_expression(raw):
+    """Expression QWeb lisant un placeholder dans le dictionnaire de valeurs ``v``"""
+    return "v.get(%r, '')" % placeholder_key(raw)
+
+
+def _qweb_nodes(text):
+    """
+    Découpe un texte autour des placeholders
+
+    Returns:
+        (texte avant le premier placeholder, liste d'éléments <t t-out/> dont
+        le tail porte le texte qui suit)
+    """
+    parts = PLACEHOLDER_PATTERN.split(text)
+    nodes = []
+    for i in range(1, len(parts), 2):
+        node = etree.Element('t')
+        node.set('t-out', _qweb_expression(parts[i]))
+        node.tail = parts[i + 1]
+        nodes.append(node)
+    return parts[0], nodes
+
+
+def html_to_qweb(content):
+    """
+    Convertit un contenu HTML avec placeholders {{...}} en template QWeb (XML)
+
+    Chaque placeholder devient ``<t t-out="v.get('clé', '')"/>`` (clé normalisée
+    par placeholder_key) ; dans un attribut, celui-ci devient ``t-attf-*``.
+    Les directives t-* présentes dans le contenu sont retirées : seul le
+    dictionnaire ``v`` est accessible au rendu.
+    """
+    if not content or not content.strip():
+        return ''
+    root = lxml_html.fragment_fromstring(content, create_parent='t')
+    for element in list(root.iter()):
+        if isinstance(element.tag, str):
+            for name in list(element.attrib):
+                value = element.attrib[name]
+                if name.startswith('t-'):
+                    del element.attrib[name]
+                elif PLACEHOLDER_PATTERN.search(value):
+                    del element.attrib[name]
+                    element.set('t-attf-' + name, PLACEHOLDER_PATTERN.sub(
+                        lambda match: '{{ %s }}' % _qweb_expression(match.group(1)), value
+                    ))
+            if element.text and PLACEHOLDER_PATTERN.search(element.text):
+                element.text, nodes = _qweb_nodes(element.text)
+                for index, node in enumerate(nodes):
+                    element.insert(index, node)
+        if element is not root and element.tail and PLACEHOLDER_PATTERN.search(element.tail):
+            element.tail, nodes = _qweb_nodes(element.tail)
+            for node in reversed(nodes):
+                element.addnext(node)
+    return etree.tostring(root, encoding='unicode')
+
+
+def compile_template(content):
+    """
+    Découpe un contenu en liste de tokens
+
+    Les indices pairs sont des morceaux littéraux, les indices impairs les
+    clés (normalisées par placeholder_key) des placeholders {{...}}.
+    """
+    tokens = PLACEHOLDER_PATTERN.split(content or '')
+    for i in range(1, len(tokens), 2):
+        tokens[i] = placeholder_key(tokens[i])
+    return tuple(tokens)
+
+
+def render_template(tokens, values):
+    """
+    Rend une liste de tokens en une seule passe
+
+    Args:
+        tokens: Résultat de compile_template
+        values: Dictionnaire {clé normalisée: valeur} ; les placeholders
+            absents sont remplacés par une chaîne vide
+    """
+    parts = list(tokens)
+    for i in range(1, len(parts), 2):
+        parts[i] = values.get(parts[i], '')
+    return ''.join(parts)
 
 
 class LettreMotivationTemplate(models.Model):
@@ -63,6 +206,15 @@ class LettreMotivationTemplate(models.Model):
         help='Template QWeb pour le rendu final (généré automatiquement)'
     )
 
+    qweb_view_id = fields.Many2one(
+        'ir.ui.view',
+        string='Vue QWeb',
+        copy=False,
+        ondelete='set null',
+        readonly=True,
+        help='Vue QWeb portant contenu_qweb ; Odoo compile et met en cache son rendu'
+    )
+
     format_sortie = fields.Selection(
         [
             ('pdf', 'PDF'),
@@ -104,34 +256,8 @@ class LettreMotivationTemplate(models.Model):
 
     @api.model
     def _extract_variables_from_content(self, content):
-        """Extrait les variables du contenu (format {{variable}})"""
-        if not content:
-            return []
-        # Pattern amélioré pour accepter espaces, apostrophes, caractères accentués, etc.
-        # Capture tout ce qui est entre {{ et }} sauf les accolades fermantes
-        pattern = r'\{\{([^}]+?)\}\}'
-        variables_raw = re.findall(pattern, content)
-        
-        # Normaliser les variables : créer un nom technique valide
-        variables = []
-        for var_raw in variables_raw:
-            var_raw = var_raw.strip()  # Enlever les espaces en début/fin
-            if var_raw:
-                # Créer un nom technique à partir du libellé
-                # Remplacer espaces, apostrophes, caractères spéciaux par underscore
-                var_name = re.sub(r'[^\w]', '_', var_raw)
-                # Enlever les underscores multiples
-                var_name = re.sub(r'_+', '_', var_name)
-                # Enlever les underscores en début/fin
-                var_name = var_name.strip('_')
-                # Convertir en minuscules pour la cohérence
-                var_name = var_name.lower()
-                
-                if var_name:  # S'assurer qu'on a un nom valide
-                    variables.append((var_name, var_raw))  # (nom_technique, libellé_original)
-        
-        # Retourner les noms techniques uniques
-        return list(set([v[0] for v in variables]))
+        """Extrait les noms techniques uniques des variables du contenu (format {{variable}})"""
+        return list(extract_variables(content))
 
     @api.onchange('contenu')
     def _onchange_contenu(self):
@@ -140,20 +266,193 @@ class LettreMotivationTemplate(models.Model):
         # avec les enregistrements non sauvegardés
         pass
 
+    def _get_compiled_contenu(self):
+        """
+        Retourne le contenu compilé en tokens (voir compile_template)
+
+        Le résultat est mis en cache par worker et invalidé par write_date ;
+        le hash du contenu couvre plusieurs écritures dans une même transaction.
+        """
+        self.ensure_one()
+        contenu = self.contenu or ''
+        cache_key = (self.env.cr.dbname, self.id)
+        version = (self.write_date, hash(contenu))
+        with _compiled_template_lock:
+            cached = _compiled_template_cache.get(cache_key)
+            if cached and cached[0] == version:
+                _compiled_template_cache.move_to_end(cache_key)
+                return cached[1]
+        
+        tokens = compile_template(contenu)
+        with _compiled_template_lock:
+            _compiled_template_cache[cache_key] = (version, tokens)
+            _compiled_template_cache.move_to_end(cache_key)
+            # Éviction des entrées les moins récemment utilisées
+            while len(_compiled_template_cache) > COMPILED_TEMPLATE_CACHE_SIZE:
+                _compiled_template_cache.popitem(last=False)
+        return tokens
+
+    def _get_word_template_checksum(self):
+        """Checksum de la pièce jointe stockant le fichier Word (sans lire son contenu)"""
+        self.ensure_one()
+        attachment = self.env['ir.attachment'].sudo().search_read([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'word_template'),
+            ('res_id', '=', self.id),
+        ], ['checksum'], limit=1)
+        if attachment and attachment[0]['checksum']:
+            return attachment[0]['checksum']
+        if not self.word_template:
+            return False
+        import hashlib
+        return hashlib.sha1(self.word_template).hexdigest()
+
+    def _get_docx_cache_limits(self):
+        """
+        Limites du cache des templates Word (voir tools.docx_cache), réglables
+        par les paramètres système ``lettre_motivation.docx_cache_size`` et
+        ``lettre_motivation.docx_cache_max_mb``
+        """
+        from ..tools import docx_cache
+
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        max_entries = int(get_param('lettre_motivation.docx_cache_size', docx_cache.DOCX_CACHE_MAX_ENTRIES))
+        max_mb = get_param('lettre_motivation.docx_cache_max_mb')
+        max_bytes = int(max_mb) * 1024 * 1024 if max_mb else docx_cache.DOCX_CACHE_MAX_BYTES
+        return {'max_entries': max_entries, 'max_bytes': max_bytes}
+
+    def _get_word_template_bytes(self):
+        """Octets du fichier Word, mis en cache par worker (LRU indexé par checksum)"""
+        self.ensure_one()
+        import base64
+        from ..tools import docx_cache
+
+        return docx_cache.get_template_bytes(
+            self._get_word_template_checksum(),
+            lambda: base64.b64decode(self.word_template),
+            **self._get_docx_cache_limits(),
+        )
+
+    def _get_docx_template(self):
+        """
+        Retourne un DocxTemplate prêt à être rendu pour le fichier Word
+
+        Les octets du fichier sont mis en cache par worker (voir
+        _get_word_template_bytes) ; chaque appel analyse son propre document
+        à partir de ces octets.
+        """
+        self.ensure_one()
+        import base64
+        from ..tools import docx_cache
+
+        return docx_cache.get_docx_template(
+            self._get_word_template_checksum(),
+            lambda: base64.b64decode(self.word_template),
+            **self._get_docx_cache_limits(),
+        )
+
+    def _get_template_references(self, doc=None):
+        """
+        Noms et chemins d'attributs utilisés par le fichier Word
+
+        Analysés une fois par checksum de la pièce jointe (voir
+        tools.docx_context) ; None si les balises n'ont pu être analysées.
+
+        Args:
+            doc: DocxTemplate déjà chargé ; sinon chargé depuis le cache des
+                templates si les références ne sont pas encore connues
+        """
+        self.ensure_one()
+        from ..tools import docx_context
+
+        return docx_context.get_template_references(
+            self._get_word_template_checksum(),
+            lambda: doc or self._get_docx_template(),
+        )
+
     def _convert_to_qweb(self, html_content):
         """Convertit le contenu HTML avec {{variables}} en template QWeb"""
-        if not html_content:
-            return ""
-        
-        # Remplacer {{variable}} par <t t-esc="variable"/>
-        pattern = r'\{\{(\w+)\}\}'
-        qweb_content = re.sub(
-            pattern,
-            r'<t t-esc="\1"/>',
-            html_content
+        try:
+            return html_to_qweb(html_content)
+        except (etree.ParserError, etree.XMLSyntaxError, ValueError) as e:
+            _logger.warning("Conversion QWeb impossible pour le modèle %s : %s", self.id, e)
+            return ''
+
+    def _sync_qweb(self):
+        """
+        Régénère contenu_qweb et la vue QWeb associée
+
+        Le code compilé de la vue est mis en cache par ir.qweb ; toute écriture
+        de vue vide ce cache dans tous les workers, l'arch n'est donc réécrite
+        que si elle change (comparée à contenu_qweb et à l'arch_db stockée).
+        Vues écrites et rendues en en_US : l'arch n'a pas de traduction.
+        """
+        View = self.env['ir.ui.view'].sudo().with_context(lang='en_US')
+        for record in self:
+            qweb = record._convert_to_qweb(record.contenu)
+            record._set_qweb_failure(bool(record.contenu) and not qweb)
+            vals = {'contenu_qweb': qweb} if qweb != record.contenu_qweb else {}
+            view = record.qweb_view_id.sudo().with_context(lang='en_US')
+            if qweb and view:
+                if qweb != record.contenu_qweb and qweb != view.arch_db:
+                    view.arch = qweb
+            elif qweb:
+                vals['qweb_view_id'] = View.create({
+                    'name': f'lettre.motivation.template.{record.id}',
+                    'type': 'qweb',
+                    'arch': qweb,
+                }).id
+            elif view:
+                vals['qweb_view_id'] = False
+                view.unlink()
+            if vals:
+                record.write(vals)
+
+    def _set_qweb_failure(self, failed):
+        """Mémorise (par worker) l'échec de conversion QWeb du contenu actuel"""
+        self.ensure_one()
+        cache_key = (self.env.cr.dbname, self.id)
+        with _qweb_failures_lock:
+            if not failed:
+                _qweb_failures.pop(cache_key, None)
+                return
+            _qweb_failures[cache_key] = hash(self.contenu or '')
+            _qweb_failures.move_to_end(cache_key)
+            while len(_qweb_failures) > COMPILED_TEMPLATE_CACHE_SIZE:
+                _qweb_failures.popitem(last=False)
+
+    def _has_qweb_failure(self):
+        """Vrai si la conversion QWeb du contenu actuel a déjà échoué dans ce worker"""
+        self.ensure_one()
+        with _qweb_failures_lock:
+            failed = _qweb_failures.get((self.env.cr.dbname, self.id))
+        return failed is not None and failed == hash(self.contenu or '')
+
+    def _render_contenu(self, values):
+        """
+        Rend le contenu du modèle avec la vue QWeb compilée
+
+        Args:
+            values: Dictionnaire {clé normalisée (placeholder_key): valeur} ;
+                les valeurs sont échappées sauf si ce sont des Markup
+
+        Returns:
+            Le HTML rendu ; repli sur le rendu par tokens (valeurs échappées)
+            si le contenu n'a pas pu être converti en QWeb
+        """
+        self.ensure_one()
+        if not self.qweb_view_id and self.contenu and not self._has_qweb_failure():
+            # Modèle antérieur à la vue QWeb : génération à la volée ; un
+            # contenu non convertible n'est pas retenté à chaque rendu
+            self.sudo()._sync_qweb()
+        if self.qweb_view_id:
+            return self.env['ir.qweb'].with_context(lang='en_US')._render(
+                self.qweb_view_id.id, {'v': values}
+            )
+        return render_template(
+            self._get_compiled_contenu(),
+            {key: escape(value) for key, value in values.items()},
         )
-        
-        return qweb_content
 
     @api.constrains('use_word_template', 'word_template', 'contenu')
     def _check_template_source(self):
@@ -237,72 +536,72 @@ class LettreMotivationTemplate(models.Model):
     def create(self, vals_list):
         """Génère automatiquement le template QWeb et détecte les variables"""
         records = super().create(vals_list)
-        for record in records:
-            if record.contenu:
-                record.contenu_qweb = record._convert_to_qweb(record.contenu)
-                # Détecter et créer les variables après la création
-                record._detect_and_create_variables()
-            elif record.word_template and record.use_word_template:
-                # Extraire le HTML depuis Word si nécessaire
+        with_contenu = records.filtered('contenu')
+        with_contenu._sync_qweb()
+        for record in records - with_contenu:
+            if record.word_template and record.use_word_template:
+                # Extraire le HTML depuis Word si nécessaire (l'écriture du contenu génère le QWeb)
                 html_content = record._extract_html_from_docx()
                 if html_content:
                     record.contenu = html_content
-                    record.contenu_qweb = record._convert_to_qweb(html_content)
-                    record._detect_and_create_variables()
+        # Détecter et créer les variables de tous les modèles en une fois
+        records._detect_and_create_variables()
         return records
 
     def write(self, vals):
         """Met à jour le template QWeb si le contenu change et détecte les variables"""
         result = super().write(vals)
         if 'contenu' in vals:
-            for record in self:
-                record.contenu_qweb = record._convert_to_qweb(record.contenu)
-                # Détecter et créer les nouvelles variables
-                record._detect_and_create_variables()
+            self._sync_qweb()
+            # Détecter et créer les nouvelles variables
+            self._detect_and_create_variables()
         elif 'word_template' in vals and vals.get('use_word_template'):
             # Extraire le HTML depuis Word si un nouveau fichier est uploadé
             for record in self:
                 html_content = record._extract_html_from_docx()
                 if html_content:
+                    # L'écriture du contenu détecte les variables
                     record.contenu = html_content
-                    record.contenu_qweb = record._convert_to_qweb(html_content)
-                    record._detect_and_create_variables()
+        return result
+    
+    def unlink(self):
+        """Supprime aussi les vues QWeb générées"""
+        views = self.qweb_view_id
+        result = super().unlink()
+        views.sudo().unlink()
         return result
     
     def _detect_and_create_variables(self):
-        """Détecte et crée automatiquement les variables dans le contenu"""
-        if not self.contenu or not self.id:
+        """
+        Détecte et crée automatiquement les variables dans le contenu
+
+        Fonctionne sur tout le recordset : une passe d'extraction par modèle,
+        une lecture des variables existantes et un seul create groupé.
+        """
+        templates = self.filtered(lambda t: t.id and t.contenu)
+        if not templates:
             return
         
-        # Extraire les variables avec leurs libellés originaux
-        pattern = r'\{\{([^}]+?)\}\}'
-        variables_raw = re.findall(pattern, self.contenu)
-        
-        # Créer un mapping nom_technique -> libellé_original
-        var_mapping = {}
-        for var_raw in variables_raw:
-            var_raw = var_raw.strip()
-            if var_raw:
-                # Créer un nom technique valide
-                var_name = re.sub(r'[^\w]', '_', var_raw)
-                var_name = re.sub(r'_+', '_', var_name)
-                var_name = var_name.strip('_').lower()
-                
-                if var_name:
-                    # Garder le libellé original (avec espaces, majuscules, etc.)
-                    if var_name not in var_mapping:
-                        var_mapping[var_name] = var_raw
-        
-        existing_vars = {var.name: var for var in self.variables_ids}
+        existing_vars = {
+            (var['template_id'], var['name'])
+            for var in self.env['lettre.motivation.variable'].search_read(
+                [('template_id', 'in', templates.ids)], ['template_id', 'name'], load=None
+            )
+        }
         
         # Créer les variables manquantes avec leurs libellés originaux
-        for var_name, var_label in var_mapping.items():
-            if var_name not in existing_vars:
-                self.env['lettre.motivation.variable'].create({
-                    'name': var_name,
-                    'label': var_label,  # Utiliser le libellé original
-                    'type': 'texte',
-                    'template_id': self.id,
-                })
+        vals_list = [
+            {
+                'name': var_name,
+                'label': var_label,  # Utiliser le libellé original
+                'type': 'texte',
+                'template_id': template.id,
+            }
+            for template in templates
+            for var_name, var_label in extract_variables(template.contenu).items()
+            if (template.id, var_name) not in existing_vars
+        ]
+        if vals_list:
+            self.env['lettre.motivation.variable'].create(vals_list)
 
 
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 
 
 class LettreMotivationVariable(models.Model):
@@ -64,3 +64,10 @@ class LettreMotivationVariable(models.Model):
          'Une variable avec le même nom existe déjà pour ce modèle!'),
     ]
 
+    def init(self):
+        # Index composite pour les recherches par modèle puis par nom
+        # (la contrainte unique(name, template_id) commence par le nom)
+        tools.create_index(
+            self.env.cr, 'lettre_motivation_variable_template_name_idx',
+            self._table, ['template_id', 'name']
+        )
@@ -44,6 +44,18 @@ class SaleOrder(models.Model):
             }
         }
 
+    def action_generate_lettres_batch(self):
+        """Action de masse : générer une lettre pour chaque commande sélectionnée"""
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Générer des Lettres en Lot'),
+            'res_model': 'lettre.motivation.batch.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {
+                'default_sale_order_ids': [(6, 0, self.ids)],
+            }
+        }
 
     def action_view_lettres(self):
         """Ouvrir la vue des lettres générées"""
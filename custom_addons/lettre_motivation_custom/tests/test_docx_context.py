@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from jinja2 import Environment
+
+from odoo.tests import TransactionCase, tagged
+
+from ..tools import docx_context, misc
+
+
+@tagged('post_install', '-at_install')
+class TestDocxContext(TransactionCase):
+    """Références des templates Word et rendu à partir d'instantanés"""
+
+    def _render(self, source, **values):
+        return Environment().from_string(source).render(**values)
+
+    def test_helper_argument_fields_are_referenced(self):
+        """Les attributs lus par une fonction utilitaire font partie des références"""
+        references = docx_context.extract_references(
+            "{% for line in docs.order_line %}"
+            "{{ convert_currency(line.price_total, currency_field=line.currency_id) }}"
+            "{% endfor %}",
+            misc.TEMPLATE_HELPER_FIELDS,
+        )
+        self.assertIn(('order_line', 'currency_id', 'name'), references['docs'])
+
+    def test_convert_currency_through_snapshot(self):
+        """convert_currency rend la même devise avec un instantané qu'avec l'enregistrement"""
+        source = "{{ convert_currency(1234.5, company.currency_id) }}"
+        company = self.env.company
+        Instance = self.env['lettre.motivation.instance']
+        references = docx_context.extract_references(source, misc.TEMPLATE_HELPER_FIELDS)
+        tree = Instance._get_reference_tree(references['company'])
+        self.assertTrue(Instance._can_snapshot(company._name, tree))
+        snapshot = Instance._snapshot_records(company, tree)[0]
+
+        rendered = self._render(source, company=snapshot, convert_currency=misc.convert_currency)
+        self.assertEqual(
+            rendered,
+            self._render(source, company=company, convert_currency=misc.convert_currency),
+        )
+        self.assertNotIn('res.currency', rendered)
@@ -1,2 +1,3 @@
-from . import misc
-
+# -*- coding: utf-8 -*-
+# Les sous-modules sont importés à la demande : misc, docx_cache, render_pool et
+# pdf_renderer dépendent de bibliothèques optionnelles (docxtpl, WeasyPrint...)
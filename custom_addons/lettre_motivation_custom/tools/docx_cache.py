@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Cache LRU des fichiers Word (docxtpl) utilisés comme templates
+
+Le cache garde, par worker, les octets du fichier associés au checksum de la
+pièce jointe : ils ne sont ni relus depuis le filestore ni décodés à chaque
+lettre. docxtpl modifie le document en place lors du rendu ; chaque rendu
+analyse donc une seule fois son propre document à partir de ces octets
+(``init_docx``), sans copie profonde d'un document en cache.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+_logger = logging.getLogger(__name__)
+
+# Limites par défaut (surchargées par les paramètres système)
+DOCX_CACHE_MAX_ENTRIES = 32
+DOCX_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# {checksum: octets du template}
+_docx_template_cache = OrderedDict()
+
+# Protège le cache, partagé par les threads du serveur threadé
+_docx_template_lock = threading.Lock()
+
+
+def _evict(max_entries, max_bytes):
+    """Retire les entrées les moins récemment utilisées au-delà des limites (verrou pris)"""
+    total = sum(len(template_bytes) for template_bytes in _docx_template_cache.values())
+    while len(_docx_template_cache) > 1 and (
+        len(_docx_template_cache) > max_entries or total > max_bytes
+    ):
+        checksum, template_bytes = _docx_template_cache.popitem(last=False)
+        total -= len(template_bytes)
+        _logger.debug("Template Word %s retiré du cache", checksum)
+
+
+def get_template_bytes(checksum, load_bytes, max_entries=None, max_bytes=None):
+    """
+    Octets du fichier Word, lus une fois par checksum
+
+    Args:
+        checksum: Empreinte du fichier Word (clé du cache)
+        load_bytes: Fonction sans argument renvoyant les octets du fichier,
+            appelée uniquement en cas d'absence dans le cache
+        max_entries: Nombre maximum de templates en cache
+        max_bytes: Taille cumulée maximum des fichiers en cache
+    """
+    if max_entries is None:
+        max_entries = DOCX_CACHE_MAX_ENTRIES
+    if max_bytes is None:
+        max_bytes = DOCX_CACHE_MAX_BYTES
+
+    if checksum:
+        with _docx_template_lock:
+            template_bytes = _docx_template_cache.get(checksum)
+            if template_bytes is not None:
+                _docx_template_cache.move_to_end(checksum)
+                return template_bytes
+
+    template_bytes = load_bytes()
+    if checksum and max_entries > 0 and len(template_bytes) <= max_bytes:
+        with _docx_template_lock:
+            _docx_template_cache[checksum] = template_bytes
+            _evict(max_entries, max_bytes)
+    return template_bytes
+
+
+def get_docx_template(checksum, load_bytes, max_entries=None, max_bytes=None):
+    """
+    Renvoie un DocxTemplate prêt à être rendu
+
+    Args:
+        checksum, load_bytes, max_entries, max_bytes: voir get_template_bytes
+
+    Returns:
+        Un DocxTemplate indépendant, analysé une seule fois, pouvant être
+        rendu et sauvegardé
+    """
+    from docxtpl import DocxTemplate
+
+    template_bytes = get_template_bytes(checksum, load_bytes, max_entries, max_bytes)
+    doc = DocxTemplate(BytesIO(template_bytes))
+    # docxtpl >= 0.12 n'analyse le document qu'ici (constructeur paresseux)
+    doc.init_docx()
+    return doc
+
+
+def clear_docx_template_cache():
+    """Vide le cache du worker courant"""
+    with _docx_template_lock:
+        _docx_template_cache.clear()
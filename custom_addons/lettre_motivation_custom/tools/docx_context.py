@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Références Jinja d'un template Word (docxtpl)
+
+Les balises Jinja du document (corps, en-têtes et pieds de page) sont
+analysées une fois par version du fichier pour connaître les noms utilisés
+par le template et les chemins d'attributs lus sur chacun d'eux, par exemple
+``docs.partner_id.name`` ou ``line.product_id.name`` dans une boucle
+``{% for line in docs.order_line %}``. Le contexte de rendu peut alors ne
+contenir que ces noms et les champs correspondants être lus en lot avant le
+rendu.
+
+Les attributs qu'une fonction utilitaire lit sur ses arguments (par exemple
+le code de la devise passée à ``convert_currency``) sont ajoutés aux chemins
+de l'argument.
+
+Les enregistrements utilisés par le template peuvent aussi être figés en
+instantanés (RecordSnapshot) : des valeurs picklables, identiques pour le
+rendu en série et le rendu dans le pool de processus.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+_logger = logging.getLogger(__name__)
+
+# Nombre de templates dont les références sont gardées par worker
+TEMPLATE_REFERENCES_MAX_ENTRIES = 256
+
+# {checksum: {nom: {chemin d'attributs}} ou None si le template n'a pu être analysé}
+_template_references = OrderedDict()
+
+# Protège le cache, partagé par les threads du serveur threadé
+_template_references_lock = threading.Lock()
+
+
+def template_source(tpl):
+    """Source Jinja du document (corps, en-têtes et pieds de page)"""
+    sources = [tpl.patch_xml(tpl.get_xml())]
+    for uri in (tpl.HEADER_URI, tpl.FOOTER_URI):
+        for _rel_key, part in tpl.get_headers_footers(uri):
+            sources.append(tpl.patch_xml(tpl.get_part_xml(part)))
+    return ''.join(sources)
+
+
+def _reference_path(node, aliases):
+    """(nom, chemin d'attributs) d'une expression ``a.b['c'][0].d``, ou None"""
+    from jinja2 import nodes
+
+    path = []
+    while True:
+        if isinstance(node, nodes.Getattr):
+            path.append(node.attr)
+        elif isinstance(node, nodes.Getitem):
+            # Un indice entier désigne un enregistrement du même modèle
+            if isinstance(node.arg, nodes.Const) and isinstance(node.arg.value, str):
+                path.append(node.arg.value)
+        elif isinstance(node, nodes.Name):
+            break
+        else:
+            return None
+        node = node.node
+    path.reverse()
+    if node.name in aliases:
+        root, prefix = aliases[node.name]
+        return root, prefix + tuple(path)
+    return node.name, tuple(path)
+
+
+def _helper_arguments(node, helper_fields):
+    """(argument, chemins lus) des arguments d'un appel de fonction utilitaire"""
+    from jinja2 import nodes
+
+    if not isinstance(node.node, nodes.Name):
+        return
+    for position, keyword, paths in helper_fields.get(node.node.name, ()):
+        if position < len(node.args):
+            yield node.args[position], paths
+            continue
+        for argument in node.kwargs:
+            if argument.key == keyword:
+                yield argument.value, paths
+
+
+def extract_references(source, helper_fields=None):
+    """
+    Noms et chemins d'attributs référencés par une source Jinja
+
+    Les variables de boucle (``for``) et d'affectation (``set``) sont
+    ramenées à l'expression dont elles proviennent.
+
+    Args:
+        source: Source Jinja du template
+        helper_fields: Attributs lus par les fonctions utilitaires sur leurs
+            arguments (voir misc.TEMPLATE_HELPER_FIELDS)
+
+    Returns:
+        Dictionnaire {nom: ensemble de tuples d'attributs}
+    """
+    from jinja2 import Environment, nodes
+
+    references = {}
+    aliases = {}
+    ast = Environment().parse(source)
+    node_types = (nodes.For, nodes.Assign, nodes.Call, nodes.Getattr, nodes.Getitem, nodes.Name)
+    for node in ast.find_all(node_types):
+        if isinstance(node, nodes.Call):
+            for argument, paths in _helper_arguments(node, helper_fields or {}):
+                reference = _reference_path(argument, aliases)
+                if reference:
+                    references.setdefault(reference[0], set()).update(reference[1] + path for path in paths)
+            continue
+        if isinstance(node, (nodes.For, nodes.Assign)):
+            source_node = node.iter if isinstance(node, nodes.For) else node.node
+            reference = _reference_path(source_node, aliases)
+            if reference and isinstance(node.target, nodes.Name):
+                aliases[node.target.name] = reference
+            continue
+        if isinstance(node, nodes.Name) and node.ctx != 'load':
+            continue
+        reference = _reference_path(node, aliases)
+        if reference:
+            references.setdefault(reference[0], set()).add(reference[1])
+    return references
+
+
+def get_template_references(checksum, load_template):
+    """
+    Références du template, analysées une fois par checksum du fichier Word
+
+    Args:
+        checksum: Empreinte du fichier Word (clé du cache)
+        load_template: Fonction sans argument renvoyant le DocxTemplate,
+            appelée uniquement si les références ne sont pas en cache
+
+    Returns:
+        Dictionnaire {nom: ensemble de tuples d'attributs}, ou None si le
+        template n'a pu être analysé (le rendu signalera alors l'erreur)
+    """
+    if checksum:
+        with _template_references_lock:
+            if checksum in _template_references:
+                _template_references.move_to_end(checksum)
+                return _template_references[checksum]
+
+    from jinja2 import TemplateSyntaxError
+    from .misc import TEMPLATE_HELPER_FIELDS
+
+    try:
+        references = extract_references(template_source(load_template()), TEMPLATE_HELPER_FIELDS)
+    except TemplateSyntaxError as e:
+        _logger.warning("Analyse des balises du template Word %s impossible : %s", checksum, e)
+        references = None
+
+    if checksum:
+        with _template_references_lock:
+            _template_references[checksum] = references
+            while len(_template_references) > TEMPLATE_REFERENCES_MAX_ENTRIES:
+                _template_references.popitem(last=False)
+    return references
+
+
+class RecordSnapshot:
+    """
+    Valeurs lues d'un enregistrement, accessibles comme ses attributs
+
+    Se comporte comme un enregistrement Odoo dans un template : vrai s'il
+    existe, de longueur 1 ou 0, itérable sur lui-même et affiché sous la forme
+    ``modele(id,)``. Les relations sont elles-mêmes des instantanés (many2one)
+    ou des listes d'instantanés (x2many).
+    """
+
+    def __init__(self, model, record_id, values):
+        self._model = model
+        self._id = record_id
+        self._values = values
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __len__(self):
+        return 1 if self._id else 0
+
+    def __iter__(self):
+        if self._id:
+            yield self
+
+    def __repr__(self):
+        return f"{self._model}({self._id},)" if self._id else f"{self._model}()"
+
+    __str__ = __repr__
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Fusion de documents DOCX (docxcompose)
+"""
+
+from io import BytesIO
+
+
+def merge_docx(sources, target):
+    """
+    Ajoute des documents DOCX bout à bout, un saut de page entre chacun
+
+    Les documents sources sont lus un par un : seul le document fusionné
+    est gardé en mémoire.
+
+    Args:
+        sources: Itérable (éventuellement paresseux) des octets de chaque document
+        target: Fichier (ou chemin) où écrire le document fusionné
+
+    Returns:
+        Le nombre de documents fusionnés
+    """
+    from docx import Document
+    from docxcompose.composer import Composer
+
+    composer = None
+    count = 0
+    for data in sources:
+        document = Document(BytesIO(data))
+        count += 1
+        if composer is None:
+            composer = Composer(document)
+            continue
+        composer.doc.add_page_break()
+        composer.append(document)
+    if composer is not None:
+        composer.save(target)
+    return count
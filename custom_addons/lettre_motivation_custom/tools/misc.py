@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import re
+import threading
+from collections import OrderedDict
 from io import BytesIO
 from base64 import b64decode
 from datetime import datetime
+from functools import partial
 from docx import Document
 from docx.shared import Mm
 from docxtpl import InlineImage, RichText
@@ -11,6 +16,42 @@ from num2words import num2words
 from babel.dates import format_date
 from babel.numbers import format_currency
 
+# Cheap check for an HTML start tag (html2docx ignores plain text)
+HTML_TAG = re.compile(r'<[A-Za-z][^>]*>')
+
+# Converted HTML blocks kept per worker: {sha1 of the HTML: docx bytes},
+# shared by the threads of the threaded server (guarded by a lock)
+HTML_DOCX_CACHE_MAX_ENTRIES = 256
+_html_docx_cache = OrderedDict()
+_html_docx_lock = threading.Lock()
+
+# Decoded images kept per worker: {sha1 of the base64 input: image bytes},
+# shared by the threads of the threaded server (guarded by a lock)
+IMAGE_CACHE_MAX_ENTRIES = 64
+IMAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+_image_cache = OrderedDict()
+_image_lock = threading.Lock()
+
+def _decode_image(imgb64):
+    """Decode a base64 image, memoised per worker by digest of the input"""
+    if isinstance(imgb64, str):
+        imgb64 = imgb64.encode('ascii')
+    digest = hashlib.sha1(imgb64).hexdigest()
+    with _image_lock:
+        image = _image_cache.get(digest)
+        if image is not None:
+            _image_cache.move_to_end(digest)
+            return image
+
+    image = b64decode(imgb64)
+    if len(image) <= IMAGE_CACHE_MAX_BYTES:
+        with _image_lock:
+            _image_cache[digest] = image
+            total = sum(len(cached) for cached in _image_cache.values())
+            while len(_image_cache) > IMAGE_CACHE_MAX_ENTRIES or total > IMAGE_CACHE_MAX_BYTES:
+                total -= len(_image_cache.popitem(last=False)[1])
+    return image
+
 # Partial Function
 def render_image(tpl, imgb64, width=None, height=None):
     """Render an image in the document"""
@@ -20,27 +61,39 @@ def render_image(tpl, imgb64, width=None, height=None):
     if not imgb64:
         return ''
 
-    image_stream = BytesIO(b64decode(imgb64))
+    image_stream = BytesIO(_decode_image(imgb64))
     return InlineImage(
         tpl, image_descriptor=image_stream, width=width, height=height
     )
     
-def render_html_as_subdoc(tpl, html_code=None):
-    """Render HTML as a subdocument"""
-    if not (
-        isinstance(html_code, str)
-        and bool(BeautifulSoup(html_code, "html.parser").find())
-    ):
-        return ""
+def _html_to_docx_bytes(html_code):
+    """Convert HTML to docx bytes, memoised per worker by HTML digest"""
+    digest = hashlib.sha1(html_code.encode('utf-8')).hexdigest()
+    with _html_docx_lock:
+        docx_bytes = _html_docx_cache.get(digest)
+        if docx_bytes is not None:
+            _html_docx_cache.move_to_end(digest)
+            return docx_bytes
 
+    from htmldocx import HtmlToDocx
     temp = BytesIO()
     desc_document = Document()
-    from htmldocx import HtmlToDocx
-    new_parser = HtmlToDocx()
-    new_parser.add_html_to_document(html_code, desc_document)
+    HtmlToDocx().add_html_to_document(html_code, desc_document)
     desc_document.save(temp)
-    temp.seek(0)
-    return tpl.new_subdoc(temp)
+    docx_bytes = temp.getvalue()
+
+    with _html_docx_lock:
+        _html_docx_cache[digest] = docx_bytes
+        while len(_html_docx_cache) > HTML_DOCX_CACHE_MAX_ENTRIES:
+            _html_docx_cache.popitem(last=False)
+    return docx_bytes
+
+def render_html_as_subdoc(tpl, html_code=None):
+    """Render HTML as a subdocument (one conversion per distinct HTML)"""
+    if not (isinstance(html_code, str) and HTML_TAG.search(html_code)):
+        return ""
+
+    return tpl.new_subdoc(BytesIO(_html_to_docx_bytes(html_code)))
 
 
 def add_new_subdoc(tpl, docx_file):
@@ -56,7 +109,7 @@ def replace_image(tpl, dummy_pic, imgb64):
     if not imgb64:
         return ''
 
-    tpl.replace_pic(dummy_pic, BytesIO(b64decode(imgb64)))
+    tpl.replace_pic(dummy_pic, BytesIO(_decode_image(imgb64)))
     return ''
 
 def replace_media(tpl, dummy_pic, imgb64):
@@ -64,7 +117,7 @@ def replace_media(tpl, dummy_pic, imgb64):
     if not imgb64:
         return ''
 
-    tpl.replace_media(dummy_pic, BytesIO(b64decode(imgb64)))
+    tpl.replace_media(dummy_pic, BytesIO(_decode_image(imgb64)))
     return ''
 
 def replace_embedded(tpl, dummy_embeed, file_b64):
@@ -115,3 +168,43 @@ def rich_text(text, **kwargs):
     
     return RichText(text, **kwargs)
 
+
+# Fonctions exposées aux templates Word : {nom: (fonction, liée au template)}
+TEMPLATE_HELPERS = {
+    "spelled_out": (spelled_out, False),
+    "parsehtml": (parse_html, False),
+    "formatdate": (formatdate, False),
+    "convert_currency": (convert_currency, False),
+    "formatabs": (format_abs, False),
+    "rich_text": (rich_text, False),
+    "render_image": (render_image, True),
+    "html2docx": (render_html_as_subdoc, True),
+    "add_subdoc": (add_new_subdoc, True),
+    "replace_image": (replace_image, True),
+    "replace_media": (replace_media, True),
+    "replace_embedded": (replace_embedded, True),
+    "replace_zipname": (replace_zipname, True),
+}
+
+
+# Record attributes read by helpers from their arguments, so that snapshots
+# (see docx_context.RecordSnapshot) carry them:
+# {name: [(position, keyword, attribute paths)]}
+TEMPLATE_HELPER_FIELDS = {
+    "convert_currency": [(1, "currency_field", (("name",),))],
+}
+
+
+def get_template_helpers(tpl, names=None):
+    """
+    Fonctions utilitaires exposées aux templates Word (docxtpl)
+
+    Args:
+        tpl: DocxTemplate auquel lier les fonctions qui le modifient
+        names: Noms utilisés par le template ; toutes les fonctions si None
+    """
+    return {
+        name: partial(helper, tpl) if bound else helper
+        for name, (helper, bound) in TEMPLATE_HELPERS.items()
+        if names is None or name in names
+    }
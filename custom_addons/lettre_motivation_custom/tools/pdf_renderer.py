@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Rendu PDF des lettres (WeasyPrint) avec ressources partagées par worker
+
+La configuration des polices (FontConfiguration) et la feuille de style des
+lettres sont créées une seule fois par processus puis réutilisées : seules
+les lettres elles-mêmes sont analysées à chaque rendu.
+"""
+
+from html import escape
+
+# Feuille de style commune à toutes les lettres PDF
+LETTER_CSS = """
+@page {
+    size: A4;
+    margin: 2cm;
+}
+body {
+    font-family: Arial, sans-serif;
+    line-height: 1.6;
+}
+table {
+    width: 100%;
+    border-collapse: collapse;
+    margin: 10px 0;
+}
+table td, table th {
+    border: 1px solid #ddd;
+    padding: 8px;
+}
+table th {
+    background-color: #f2f2f2;
+}
+"""
+
+# (FontConfiguration, CSS) du processus courant
+_resources = None
+
+
+def _get_resources():
+    """Configuration des polices et feuille de style, créées au premier appel"""
+    global _resources
+    if _resources is None:
+        from weasyprint import CSS
+        try:
+            from weasyprint.text.fonts import FontConfiguration
+        except ImportError:  # WeasyPrint < 53
+            from weasyprint.fonts import FontConfiguration
+        font_config = FontConfiguration()
+        _resources = (font_config, CSS(string=LETTER_CSS, font_config=font_config))
+    return _resources
+
+
+def warm_up():
+    """Prépare les ressources à l'avance (avant un fork du pool de rendu)"""
+    _get_resources()
+
+
+def letter_html(body, title=None):
+    """Document HTML complet d'une lettre ; le style est appliqué au rendu"""
+    title_tag = f"\n    <title>{escape(title)}</title>" if title else ''
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">{title_tag}
+</head>
+<body>
+{body or ''}
+</body>
+</html>"""
+
+
+def _render_document(html):
+    """Mise en page d'un document HTML avec les ressources partagées"""
+    from weasyprint import HTML
+
+    font_config, stylesheet = _get_resources()
+    return HTML(string=html).render(stylesheets=[stylesheet], font_config=font_config)
+
+
+def render_pdf(html):
+    """Rend un document HTML en PDF"""
+    return _render_document(html).write_pdf()
+
+
+def render_letters_pdf(bodies, target=None):
+    """
+    Rend plusieurs lettres dans un seul document PDF, une lettre par page
+
+    Les lettres sont mises en page en une passe (un seul document HTML avec
+    sauts de page).
+
+    Args:
+        bodies: Itérable des contenus HTML (corps) des lettres
+        target: Fichier (ou chemin) où écrire le PDF ; sinon les octets sont renvoyés
+    """
+    # Saut de page avant chaque lettre sauf la première (pas de page blanche finale)
+    page_break = ' style="break-before: page;"'
+    sections = '\n'.join(
+        f'<section{page_break if index else ""}>\n{body or ""}\n</section>'
+        for index, body in enumerate(bodies)
+    )
+    document = _render_document(letter_html(sections))
+    return document.write_pdf(target)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Rendu parallèle des fichiers de lettres (DOCX / PDF)
+
+Les fonctions de ce module ne manipulent aucun enregistrement ORM : elles
+reçoivent des contextes entièrement matérialisés et picklables (dictionnaire
+de valeurs, HTML) et renvoient les octets du fichier. Elles peuvent donc être
+exécutées dans des processus séparés. Les octets des templates Word sont
+transmis une fois par template (indexés par checksum), et non dans chaque
+travail.
+"""
+
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+_logger = logging.getLogger(__name__)
+
+# Octets des templates Word {checksum: octets} dans un processus du pool
+_pool_templates = {}
+
+
+def render_docx_template(template_bytes, values, checksum=None):
+    """Rend un template Word (docxtpl) avec un dictionnaire de valeurs"""
+    from . import docx_cache, docx_context, misc
+
+    # Le cache du processus évite de réanalyser le même template à chaque lettre
+    doc = docx_cache.get_docx_template(checksum, lambda: template_bytes)
+    context = dict(values)
+    references = docx_context.get_template_references(checksum, lambda: doc)
+    context.update(misc.get_template_helpers(doc, references))
+    doc.render(context)
+    output = BytesIO()
+    doc.save(output)
+    return output.getvalue()
+
+
+def render_html_docx(html):
+    """Convertit un contenu HTML en document DOCX"""
+    from docx import Document
+    from htmldocx import HtmlToDocx
+
+    doc = Document()
+    HtmlToDocx().add_html_to_document(html or '', doc)
+    output = BytesIO()
+    doc.save(output)
+    return output.getvalue()
+
+
+def render_pdf(html):
+    """Convertit un document HTML complet en PDF (WeasyPrint)"""
+    from . import pdf_renderer
+
+    return pdf_renderer.render_pdf(html)
+
+
+RENDERERS = {
+    'docx_template': lambda payload, templates: render_docx_template(
+        templates[payload['checksum']], payload['values'], payload['checksum']
+    ),
+    'html_docx': lambda payload, templates: render_html_docx(payload['html']),
+    'pdf': lambda payload, templates: render_pdf(payload['html']),
+}
+
+
+def render_job(kind, payload, templates=None):
+    """
+    Exécute un rendu
+
+    Args:
+        kind: Type de rendu (clé de RENDERERS)
+        payload: Contexte matérialisé du rendu
+        templates: Octets des templates Word {checksum: octets}
+    """
+    return RENDERERS[kind](payload, templates or {})
+
+
+def _init_pool_process(templates):
+    """Initialisation d'un processus du pool : templates hérités du worker (fork, sans pickle)"""
+    global _pool_templates
+    _pool_templates = templates
+
+
+def _render_pool_job(kind, payload):
+    """Exécute un rendu dans un processus du pool"""
+    return render_job(kind, payload, _pool_templates)
+
+
+def can_fork():
+    """
+    Indique si le processus courant peut être forké sans risque
+
+    Un fork ne copie que le thread appelant : les verrous tenus par les
+    autres threads resteraient pris dans les processus fils. La décision
+    dépend donc du mode du serveur et non du nombre de threads :
+
+    - serveur prefork (``workers`` > 0) : chaque worker HTTP ou cron traite
+      une requête à la fois dans son thread de travail, le thread principal
+      ne faisant que surveiller les limites ; le fork est sûr ;
+    - serveur threadé (``workers`` = 0, y compris shell et tests) ou
+      processus evented (gevent) : les autres threads ou greenlets peuvent
+      tenir des verrous (pool de connexions, logging) ; rendu en série.
+
+    Les contextes spawn et forkserver ne sont pas utilisables : les
+    processus fils ne connaissent pas le chemin des addons (odoo.addons)
+    configuré au démarrage d'Odoo.
+    """
+    import odoo
+    from odoo.tools import config
+
+    return not odoo.evented and bool(config['workers'])
+
+
+def render_many(jobs, max_workers=1, templates=None):
+    """
+    Rend une liste de travaux, en parallèle si max_workers > 1
+
+    Args:
+        jobs: Liste de tuples (clé, type, payload)
+        max_workers: Nombre de processus du pool ; rendu en série si le
+            processus courant ne peut être forké (voir can_fork)
+        templates: Octets des templates Word {checksum: octets}, référencés
+            par le checksum des travaux 'docx_template' ; transmis une seule
+            fois à chaque processus du pool
+
+    Returns:
+        Dictionnaire {clé: (octets, None)} ou {clé: (None, message d'erreur)}
+    """
+    templates = templates or {}
+    results = {}
+    if max_workers <= 1 or len(jobs) <= 1 or not can_fork():
+        for key, kind, payload in jobs:
+            try:
+                results[key] = (render_job(kind, payload, templates), None)
+            except Exception as e:
+                results[key] = (None, str(e))
+        return results
+
+    # fork : les processus héritent des modules déjà importés par le worker,
+    # des templates (arguments de l'initialisation, non picklés) ainsi que
+    # des polices et de la feuille de style PDF préparées ici ; ils ne
+    # touchent jamais aux connexions héritées et se terminent par os._exit
+    if any(kind == 'pdf' for key, kind, payload in jobs):
+        from . import pdf_renderer
+        pdf_renderer.warm_up()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(
+        max_workers=min(max_workers, len(jobs)),
+        mp_context=context,
+        initializer=_init_pool_process,
+        initargs=(templates,),
+    ) as executor:
+        futures = {
+            key: executor.submit(_render_pool_job, kind, payload)
+            for key, kind, payload in jobs
+        }
+        for key, future in futures.items():
+            try:
+                results[key] = (future.result(), None)
+            except Exception as e:
+                _logger.warning("Rendu parallèle en échec pour %s : %s", key, e)
+                results[key] = (None, str(e))
+    return results
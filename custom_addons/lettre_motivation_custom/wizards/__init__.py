@@ -2,4 +2,6 @@
 
 from . import lettre_generation_wizard
 from . import lettre_selection_wizard
+from . import lettre_batch_wizard
 
+from . import lettre_fusion_wizard
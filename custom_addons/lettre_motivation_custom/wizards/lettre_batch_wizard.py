@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+
+class LettreMotivationBatchWizard(models.TransientModel):
+    """Wizard pour générer des lettres pour plusieurs commandes"""
+    _name = 'lettre.motivation.batch.wizard'
+    _description = 'Assistant de Génération de Lettres en Lot'
+
+    sale_order_ids = fields.Many2many(
+        'sale.order',
+        string='Commandes',
+        required=True,
+        help='Commandes pour lesquelles générer une lettre'
+    )
+
+    template_id = fields.Many2one(
+        'lettre.motivation.template',
+        string='Modèle de Lettre',
+        required=True,
+        domain=[('active', '=', True)],
+        help='Modèle de lettre à utiliser'
+    )
+
+    format_sortie = fields.Selection(
+        [
+            ('pdf', 'PDF'),
+            ('html', 'HTML'),
+            ('docx', 'DOCX'),
+        ],
+        string='Format de Sortie',
+        required=True,
+        default='pdf',
+        help='Format des fichiers à générer'
+    )
+
+    order_count = fields.Integer(
+        string='Nombre de Commandes',
+        compute='_compute_order_count'
+    )
+
+    @api.model
+    def default_get(self, fields_list):
+        """Initialiser avec les commandes sélectionnées"""
+        res = super().default_get(fields_list)
+        if 'sale_order_ids' in fields_list and not res.get('sale_order_ids'):
+            if self.env.context.get('active_model') == 'sale.order' and self.env.context.get('active_ids'):
+                res['sale_order_ids'] = [(6, 0, self.env.context['active_ids'])]
+        return res
+
+    @api.depends('sale_order_ids')
+    def _compute_order_count(self):
+        for wizard in self:
+            wizard.order_count = len(wizard.sale_order_ids)
+
+    @api.onchange('template_id')
+    def _onchange_template_id(self):
+        """Mettre à jour le format de sortie avec celui du template"""
+        if self.template_id:
+            self.format_sortie = self.template_id.format_sortie
+
+    def action_generer(self):
+        """
+        Crée toutes les lettres puis délègue le rendu au cron
+
+        Les commandes et leurs partenaires, devises et commerciaux sont lus
+        en une fois ; les lettres et leurs variables sont créées par un seul
+        create groupé. Aucun rendu n'a lieu dans la requête HTTP.
+        """
+        self.ensure_one()
+
+        if not self.sale_order_ids:
+            raise UserError(_('Aucune commande sélectionnée'))
+
+        orders = self.sale_order_ids
+        template = self.template_id
+        Instance = self.env['lettre.motivation.instance']
+
+        # Préchargement groupé des données utilisées par le mapping
+        orders.fetch(['name', 'partner_id', 'user_id', 'currency_id', 'date_order', 'amount_total'])
+        orders.partner_id.fetch(['name', 'email', 'phone', 'street', 'street2', 'city', 'zip', 'country_id'])
+        orders.partner_id.country_id.fetch(['name'])
+        orders.user_id.fetch(['name'])
+        orders.currency_id.fetch(['symbol'])
+        template_vars = template.variables_ids
+        template_vars.fetch(['name', 'valeur_par_defaut'])
+
+        batch = self.env['lettre.motivation.batch'].create({
+            'name': _('%(template)s - %(count)d commandes', template=template.name, count=len(orders)),
+            'template_id': template.id,
+            'format_sortie': self.format_sortie,
+            'total_count': len(orders),
+        })
+
+        vals_list = []
+        for order in orders:
+            mappings = Instance._get_sale_order_mappings(order)
+            lines = []
+            for var in template_vars:
+                found, valeur = Instance._match_sale_order_mapping(var.name, mappings)
+                if not found:
+                    valeur = var.valeur_par_defaut or ''
+                lines.append((0, 0, {
+                    'variable_id': var.id,
+                    'valeur': valeur,
+                    'sequence': 10,
+                }))
+            vals_list.append({
+                'template_id': template.id,
+                'sale_order_id': order.id,
+                'batch_id': batch.id,
+                'name': f"{template.name} - {order.name}",
+                'format_sortie': self.format_sortie,
+                'variables_valeurs_ids': lines,
+            })
+        # Pas de message de création ni d'abonné par lettre (mail.thread)
+        Instance.with_context(
+            tracking_disable=True,
+            mail_create_nolog=True,
+            mail_create_nosubscribe=True,
+        ).create(vals_list)
+
+        batch._trigger_processing()
+
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Génération en Lot'),
+            'res_model': 'lettre.motivation.batch',
+            'res_id': batch.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
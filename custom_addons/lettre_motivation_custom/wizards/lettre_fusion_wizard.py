@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from urllib.parse import quote as url_quote
+
+from odoo import models, fields
+
+
+class LettreMotivationFusion(models.TransientModel):
+    """
+    Fichier fusionné de plusieurs lettres, en attente de téléchargement
+
+    Le fichier est une pièce jointe de l'enregistrement (champ ``fichier``) :
+    il n'est lisible que par l'utilisateur qui a lancé la fusion et il est
+    supprimé avec l'enregistrement par le nettoyage des modèles transitoires.
+    """
+    _name = 'lettre.motivation.fusion'
+    _description = 'Fusion de Lettres'
+
+    instance_ids = fields.Many2many(
+        'lettre.motivation.instance',
+        string='Lettres',
+        readonly=True,
+        help='Lettres fusionnées dans le fichier'
+    )
+
+    fichier = fields.Binary(
+        string='Fichier',
+        attachment=True,
+        readonly=True
+    )
+
+    nom_fichier = fields.Char(
+        string='Nom du Fichier',
+        readonly=True
+    )
+
+    def _store_fichier(self, fileobj, filename, mimetype):
+        """
+        Enregistre le fichier fusionné depuis un fichier temporaire
+
+        Les octets sont écrits tels quels en pièce jointe (champ ``raw``),
+        comme les fichiers des lettres : l'ORM choisit le stockage et
+        déduplique le filestore par checksum.
+
+        Args:
+            fileobj: Fichier temporaire contenant le document fusionné
+            filename: Nom du fichier téléchargé
+            mimetype: Type MIME du fichier
+        """
+        self.ensure_one()
+        fileobj.seek(0)
+        self.env['ir.attachment'].create({
+            'name': filename,
+            'res_model': self._name,
+            'res_field': 'fichier',
+            'res_id': self.id,
+            'type': 'binary',
+            'raw': fileobj.read(),
+            'mimetype': mimetype,
+        })
+        self.nom_fichier = filename
+
+    def action_telecharger(self):
+        """Télécharge le fichier fusionné (servi par /web/content)"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/%s/%s/fichier/%s?download=true' % (
+                self._name, self.id, url_quote(self.nom_fichier)
+            ),
+            'target': 'self',
+        }